@@ -1,14 +1,20 @@
-from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Tuple
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 import ccxt
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from pycoingecko import CoinGeckoAPI
 # noinspection PyPackageRequirements
 from python_pubsub_client import QueueWorkerThread, ServiceBus
 from python_threadsafe_logger import sqlite_business_logger
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from tenacity import Retrying, retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
 from events import (
     AnalysisConfigurationProvided,
@@ -25,8 +31,31 @@ from logger import logger
 class DataFetcher(QueueWorkerThread):
     """Fetches market data with robust error handling and API rate limiting."""
 
-    def __init__(self, service_bus: Optional[ServiceBus] = None):
+    # Number of OHLCV requests in flight at once. Their starts are still paced by the shared client's
+    # rate limiter (see _install_shared_throttle), so extra threads only overlap the network round-trips.
+    DEFAULT_CONCURRENCY = 8
+
+    # Largest page CoinGecko's /coins/markets accepts: fewer round-trips for the top coins.
+    COINGECKO_PAGE_SIZE = 250
+    # Pages requested at once; kept small to stay under CoinGecko's per-minute rate limit.
+    COINGECKO_MAX_PARALLEL_PAGES = 4
+
+    # Fields of the PrecisionDataFetched payload, one list of values per field.
+    PRECISION_COLUMNS = (
+        "symbol", "quote_asset", "base_asset", "status", "base_asset_precision", "step_size", "min_qty", "tick_size", "min_notional",
+    )
+
+    # Binance markets are reloaded at most this often; every task in between reuses them.
+    MARKETS_TTL_SECONDS = 600
+
+    OHLCV_FETCH_LIMIT = 1000
+    OHLCV_DISK_CACHE_TTL_SECONDS = 12 * 3600
+    _MS_PER_DAY = 86_400_000
+
+    def __init__(self, service_bus: Optional[ServiceBus] = None, concurrency: int = DEFAULT_CONCURRENCY, cache_dir: Optional[str] = None):
         super().__init__(service_bus=service_bus, name="DataFetcher")
+        # Candles kept on disk between runs, one file per (symbol, timeframe); disabled when None.
+        self.cache_dir = Path(cache_dir) if cache_dir else None
         self.cg = CoinGeckoAPI()
 
         # Enable CCXT rate limiter to respect Binance API limits
@@ -34,11 +63,69 @@ class DataFetcher(QueueWorkerThread):
             {
                 "enableRateLimit": True,
                 "timeout": 30000,  # 30 seconds in milliseconds
+                # Only spot pairs are analyzed: skip loading the futures markets altogether.
+                "options": {"fetchMarkets": {"types": ["spot"]}},
             }
         )
 
+        self._binance_throttle_lock = threading.Lock()
+        self._install_shared_throttle()
+
+        # Keep one reusable connection per fetch thread: urllib3 only pools 10 per host by default,
+        # so a larger pool would otherwise open and discard connections on every request.
+        self.binance.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(concurrency, 10)))
+
+        # Fetches are independent network-bound calls: they run on a bounded pool
+        # instead of queuing one after the other behind the worker thread.
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="DataFetcher-ohlcv")
+        # CoinGecko work gets its own pool, so a slow or rate-limited page never holds a Binance slot.
+        self._coingecko_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DataFetcher-topcoins")
+
+        # Retry policy built once and applied to the Binance network calls only: the tasks catch every
+        # exception to publish their failure events, so a decorator on the whole task never retried.
+        self._binance_retry = Retrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(multiplier=2, min=5, max=20),
+            retry=retry_if_exception_type(ccxt.NetworkError),
+            reraise=True,
+            before_sleep=self._log_binance_retry,
+        )
+
+        # Markets load time; the lock keeps concurrent pool tasks from loading them twice.
+        self._markets_loaded_at: Optional[float] = None
+        self._markets: dict = {}
+        self._market_filters: Dict[str, Dict[str, dict]] = {}
+        self._markets_lock = threading.Lock()
+
         self.session_guid: Optional[str] = None
 
+    @staticmethod
+    def _log_binance_retry(retry_state) -> None:
+        """Logs a Binance retry with the call being retried, so the symbol and timeframe are in the log line."""
+        arguments = [repr(arg) for arg in retry_state.args] + [f"{key}={value!r}" for key, value in retry_state.kwargs.items()]
+        call = f"{getattr(retry_state.fn, '__name__', retry_state.fn)}({', '.join(arguments)})"
+        logger.warning(
+            f"Network error on Binance for {call}. Retrying in {int(retry_state.next_action.sleep)}s... (Attempt {retry_state.attempt_number})"
+        )
+
+    def _install_shared_throttle(self) -> None:
+        """
+        Makes the Binance rate limiter safe to share between the fetch threads.
+
+        CCXT's sync throttle reads lastRestRequestTimestamp and the request only updates it afterwards, without a lock:
+        threads entering together all see the same timestamp and none of them waits. The wait and the timestamp
+        update are serialized here, so every request of the shared client, load_markets and fetch_ohlcv pages
+        included, starts at least one rate-limit interval after the previous one.
+        """
+        exchange_throttle = self.binance.throttle
+
+        def throttle(cost=None):
+            with self._binance_throttle_lock:
+                exchange_throttle(cost)
+                self.binance.lastRestRequestTimestamp = self.binance.milliseconds()
+
+        self.binance.throttle = throttle
+
     def setup_event_subscriptions(self) -> None:
         self.service_bus.subscribe("AnalysisConfigurationProvided", self._handle_configuration_provided)
         self.service_bus.subscribe("FetchTopCoinsRequested", self._handle_fetch_top_coins_requested)
@@ -48,7 +135,8 @@ class DataFetcher(QueueWorkerThread):
     def _fetch_top_coins_task(self, n: int) -> None:
         """Fetches the top N coins, retrying each page individually on network errors."""
         coins = []
-        pages = (n + 99) // 100
+        per_page = self.COINGECKO_PAGE_SIZE
+        pages = (n + per_page - 1) // per_page
         logger.info(f"Starting to fetch {n} coins across {pages} pages from CoinGecko...")
 
         @retry(
@@ -60,26 +148,34 @@ class DataFetcher(QueueWorkerThread):
             ),
         )
         def fetch_one_page(page_num: int) -> List[dict]:
-            logger.info(f"Fetching page {page_num}/{pages} from CoinGecko...")
-            return self.cg.get_coins_markets(vs_currency="usd", per_page=100, page=page_num, timeout=30)
+            logger.debug("Fetching page %d/%d from CoinGecko...", page_num, pages)
+            return self.cg.get_coins_markets(vs_currency="usd", per_page=per_page, page=page_num, timeout=30)
+
+        started = time.perf_counter()
 
         try:
-            for page in range(1, pages + 1):
-                try:
-                    new_coins = fetch_one_page(page)
-                    if not new_coins:
-                        logger.warning(f"Page {page} from CoinGecko returned no data, stopping collection.")
+            # Pages are requested concurrently; results are still consumed in page order.
+            with ThreadPoolExecutor(
+                max_workers=max(1, min(pages, self.COINGECKO_MAX_PARALLEL_PAGES)), thread_name_prefix="DataFetcher-coingecko"
+            ) as executor:
+                page_results = executor.map(fetch_one_page, range(1, pages + 1))
+
+                for page in range(1, pages + 1):
+                    try:
+                        new_coins = next(page_results)
+                        if not new_coins:
+                            logger.warning(f"Page {page} from CoinGecko returned no data, stopping collection.")
+                            break
+
+                        coins.extend(new_coins)
+                    except requests.exceptions.RequestException as e:
+                        error_msg = f"Final failure fetching page {page} after multiple attempts: {e}"
+                        logger.error(error_msg)
+                        self.log_message(error_msg)
+                        logger.warning("Stopping top coins collection due to persistent network error.")
                         break
 
-                    coins.extend(new_coins)
-                except requests.exceptions.RequestException as e:
-                    error_msg = f"Final failure fetching page {page} after multiple attempts: {e}"
-                    logger.error(error_msg)
-                    self.log_message(error_msg)
-                    logger.warning("Stopping top coins collection due to persistent network error.")
-                    break
-
-            logger.info(f"CoinGecko fetch completed. {len(coins)} coins found.")
+            logger.info(f"CoinGecko fetch completed in {time.perf_counter() - started:.2f}s. {len(coins)} coins found.")
 
             if self.service_bus is not None:
                 self.service_bus.publish("TopCoinsFetched", TopCoinsFetched(coins=coins[:n]), self.__class__.__name__)
@@ -88,34 +184,32 @@ class DataFetcher(QueueWorkerThread):
             logger.error(error_msg)
             self.log_message(error_msg)
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2, min=5, max=20),
-        retry=retry_if_exception_type(ccxt.NetworkError),
-        before_sleep=lambda rs: logger.warning(
-            f"Network error on Binance for {rs.args[0][1]}. Retrying in {int(rs.next_action.sleep)}s..."
-        ),
-    )
     def _fetch_historical_prices_task(self, coin_id_symbol: Tuple[str, str], weeks: int, timeframe: str) -> None:
         coin_id, coin_symbol = coin_id_symbol
         symbol = f"{coin_symbol.upper()}/USDC"
-        logger.info(f"Fetching prices for {symbol} on timeframe {timeframe}...")
+        logger.debug("Fetching prices for %s on timeframe %s...", symbol, timeframe)
         prices_df = None
 
         try:
-            if not self.binance.markets:
-                self.binance.load_markets()
+            markets, _ = self._load_markets()
+            if symbol in markets:
+                # Epoch milliseconds in integer math; no timezone-aware datetime needed.
+                since = time.time_ns() // 1_000_000 - weeks * 7 * self._MS_PER_DAY
+                if self.cache_dir is not None:
+                    ohlcv = self._fetch_ohlcv_incremental(symbol, timeframe, since)
+                else:
+                    ohlcv = self._fetch_ohlcv(symbol, timeframe, since)
 
-            if symbol in self.binance.markets:
-                days = weeks * 7
-                since = int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp() * 1000)
-                ohlcv = self.binance.fetch_ohlcv(symbol, timeframe, since=since, limit=1000)
                 if ohlcv:
+                    # One float64 buffer for all rows: no per-row dtype inference, no set_index copy.
+                    # Epoch-ms timestamps fit exactly in a float64 mantissa.
+                    ohlcv_array = np.asarray(ohlcv, dtype=np.float64)
+                    timestamps = pd.to_datetime(ohlcv_array[:, 0].astype(np.int64), unit="ms", utc=True)
                     prices_df = pd.DataFrame(
-                        ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
+                        ohlcv_array[:, 1:],
+                        columns=["open", "high", "low", "close", "volume"],
+                        index=timestamps.rename("timestamp"),
                     )
-                    prices_df["timestamp"] = pd.to_datetime(prices_df["timestamp"], unit="ms", utc=True)
-                    prices_df.set_index("timestamp", inplace=True)
 
             prices_json = prices_df.to_json(orient="split") if prices_df is not None else None
             event_payload = HistoricalPricesFetched(
@@ -140,63 +234,152 @@ class DataFetcher(QueueWorkerThread):
                     self.__class__.__name__
                 )
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=2, min=5, max=20),
-        retry=retry_if_exception_type(ccxt.NetworkError),
-        before_sleep=lambda rs: logger.warning(
-            f"Network error on Binance. Retrying in {int(rs.next_action.sleep)}s..."
-        ),
-    )
+    def _load_markets(self) -> Tuple[dict, Dict[str, Dict[str, dict]]]:
+        """
+        Returns the Binance markets and their filters, loading them once per TTL even when several tasks ask at the same time.
+
+        Both are read under the same lock, so a caller never pairs the markets of one load with the filters of another.
+        """
+        with self._markets_lock:
+            now = time.monotonic()
+            if self._markets_loaded_at is not None and now - self._markets_loaded_at < self.MARKETS_TTL_SECONDS:
+                return self._markets, self._market_filters
+
+            markets = self._binance_retry(self.binance.load_markets, reload=True)
+            # Filters of every active spot market indexed by type once per load, instead of scanned by each reader.
+            self._market_filters = {
+                symbol: {f.get("filterType"): f for f in (market_info.get("info") or {}).get("filters", [])}
+                for symbol, market_info in markets.items()
+                if market_info.get("active") and market_info.get("spot")
+            }
+            self._markets = markets
+            self._markets_loaded_at = now
+            return self._markets, self._market_filters
+
+    def _fetch_ohlcv(self, symbol: str, timeframe: str, since: int) -> list:
+        """
+        Fetches every candle from since up to now, OHLCV_FETCH_LIMIT candles per Binance request.
+
+        Each page is retried on its own on network errors, so a failure never refetches the pages already received.
+        """
+        step_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        now_ms = time.time_ns() // 1_000_000
+        candles = []
+        cursor = since
+
+        while cursor <= now_ms:
+            page = self._binance_retry(self.binance.fetch_ohlcv, symbol, timeframe, since=cursor, limit=self.OHLCV_FETCH_LIMIT)
+            if not page:
+                break
+
+            candles.extend(page)
+            next_cursor = page[-1][0] + step_ms
+            # A short page means the range is exhausted.
+            if len(page) < self.OHLCV_FETCH_LIMIT or next_cursor <= cursor:
+                break
+            cursor = next_cursor
+
+        return candles
+
+    def _fetch_ohlcv_incremental(self, symbol: str, timeframe: str, since: int) -> list:
+        """
+        Fetches OHLCV candles through the on-disk cache: only the candles after the last cached one are requested.
+
+        Returns:
+            The same rows as _fetch_ohlcv(symbol, timeframe, since).
+        """
+        cache_path = self.cache_dir / f"{symbol.replace('/', '_')}_{timeframe}.npy"
+        cached = None
+
+        try:
+            if cache_path.exists():
+                cached = np.load(cache_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable OHLCV cache {cache_path}: {e}")
+
+        if cached is not None and len(cached) and cached[0, 0] <= since:
+            if self._is_disk_cache_fresh(cache_path, cached, timeframe):
+                return cached[cached[:, 0] >= since].tolist()
+            # The last cached candle may have been unfinished when it was stored: it is fetched again.
+            fetch_since = int(cached[-1, 0])
+            fresh = self._fetch_ohlcv(symbol, timeframe, fetch_since)
+            # An empty delta leaves the cached rows as the best data available.
+            if not fresh:
+                return cached[cached[:, 0] >= since].tolist()
+            older = cached[(cached[:, 0] >= since) & (cached[:, 0] < fetch_since)]
+        else:
+            fresh = self._fetch_ohlcv(symbol, timeframe, since)
+            older = np.empty((0, 6))
+
+        if not fresh:
+            return fresh
+
+        window = np.concatenate([older, np.asarray(fresh, dtype=np.float64)])
+
+        try:
+            # Written to a temporary file then renamed, so a concurrent reader never sees a partial file.
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(f"{cache_path.stem}.{threading.get_ident()}.tmp.npy")
+            np.save(tmp_path, window)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Cannot write OHLCV cache {cache_path}: {e}")
+
+        return window.tolist()
+
+    def _is_disk_cache_fresh(self, cache_path: Path, cached: np.ndarray, timeframe: str) -> bool:
+        """
+        Tells whether the cached window can be served without calling Binance.
+
+        The file must have been written less than one candle (and at most OHLCV_DISK_CACHE_TTL_SECONDS) ago,
+        and its last candle must still be the current one: once a new candle has opened, the cached
+        last candle is a stale, unfinished copy of a closed one.
+        """
+        timeframe_seconds = ccxt.Exchange.parse_timeframe(timeframe)
+        now = time.time()
+        last_open_ms = cached[-1, 0]
+
+        if not last_open_ms <= now * 1000 < last_open_ms + timeframe_seconds * 1000:
+            return False
+
+        try:
+            age = now - cache_path.stat().st_mtime
+        except OSError:
+            return False
+        return age < min(self.OHLCV_DISK_CACHE_TTL_SECONDS, timeframe_seconds)
+
     def _fetch_precision_data_task(self) -> None:
-        precision_data = []
+        rows = []
 
         try:
             logger.info("Fetching precision data from all Binance markets...")
-            markets = self.binance.load_markets()
-            for market_info in markets.values():
-                if market_info.get("active"):
-                    lot_size_filter = next(
-                        (
-                            f
-                            for f in market_info.get("info", {}).get("filters", [])
-                            if f.get("filterType") == "LOT_SIZE"
-                        ),
-                        None,
-                    )
-                    price_filter = next(
-                        (
-                            f
-                            for f in market_info.get("info", {}).get("filters", [])
-                            if f.get("filterType") == "PRICE_FILTER"
-                        ),
-                        None,
-                    )
-                    notional_filter = next(
-                        (
-                            f
-                            for f in market_info.get("info", {}).get("filters", [])
-                            if f.get("filterType") == "NOTIONAL"
-                        ),
-                        None,
-                    )
-
-                    if lot_size_filter and price_filter and notional_filter:
-                        data = {
-                            "symbol": market_info.get("symbol"),
-                            "quote_asset": market_info.get("quote"),
-                            "base_asset": market_info.get("base"),
-                            "status": market_info.get("active"),
-                            "base_asset_precision": market_info.get("info", {}).get("baseAssetPrecision"),
-                            "step_size": lot_size_filter.get("stepSize"),
-                            "min_qty": lot_size_filter.get("minQty"),
-                            "tick_size": price_filter.get("tickSize"),
-                            "min_notional": notional_filter.get("minNotional"),
-                        }
-                        precision_data.append(data)
-
-            logger.info(f"{len(precision_data)} active markets found on Binance.")
-            length = len(precision_data)
+            markets, market_filters = self._load_markets()
+            # Filters were indexed by type for every active market when the markets were loaded.
+            for symbol, filters_by_type in market_filters.items():
+                market_info = markets[symbol]
+                lot_size_filter = filters_by_type.get("LOT_SIZE")
+                price_filter = filters_by_type.get("PRICE_FILTER")
+                notional_filter = filters_by_type.get("NOTIONAL")
+
+                if lot_size_filter and price_filter and notional_filter:
+                    rows.append((
+                        market_info.get("symbol"),
+                        market_info.get("quote"),
+                        market_info.get("base"),
+                        market_info.get("active"),
+                        (market_info.get("info") or {}).get("baseAssetPrecision"),
+                        lot_size_filter.get("stepSize"),
+                        lot_size_filter.get("minQty"),
+                        price_filter.get("tickSize"),
+                        notional_filter.get("minNotional"),
+                    ))
+
+            # Published column-wise: field names are sent once instead of once per market.
+            columns = list(zip(*rows)) if rows else [()] * len(self.PRECISION_COLUMNS)
+            precision_data = {name: list(values) for name, values in zip(self.PRECISION_COLUMNS, columns)}
+
+            length = len(rows)
+            logger.info(f"{length} active markets found on Binance.")
             sqlite_business_logger.log(self.__class__.__name__, f"PrecisionDataFetched pour {length} paires")
 
             if self.service_bus is not None:
@@ -218,7 +401,7 @@ class DataFetcher(QueueWorkerThread):
     def _handle_fetch_top_coins_requested(self, event: FetchTopCoinsRequested):
 
         try:
-            self.add_task("_fetch_top_coins_task", event.n)
+            self._coingecko_executor.submit(self._fetch_top_coins_task, event.n)
         except Exception as e:
             error_msg = f"Error handling fetch top coins requested: {e}"
             logger.critical(error_msg, exc_info=True)
@@ -226,7 +409,7 @@ class DataFetcher(QueueWorkerThread):
     def _handle_fetch_historical_prices_requested(self, event: FetchHistoricalPricesRequested):
 
         try:
-            self.add_task("_fetch_historical_prices_task", event.coin_id_symbol, event.weeks, event.timeframe)
+            self._executor.submit(self._fetch_historical_prices_task, event.coin_id_symbol, event.weeks, event.timeframe)
         except Exception as e:
             error_msg = f"Error handling fetch historical prices requested: {e}"
             logger.critical(error_msg, exc_info=True)
@@ -234,7 +417,13 @@ class DataFetcher(QueueWorkerThread):
     def _handle_fetch_precision_data_requested(self, _event: FetchPrecisionDataRequested):
 
         try:
-            self.add_task("_fetch_precision_data_task")
+            self._executor.submit(self._fetch_precision_data_task)
         except Exception as e:
             error_msg = f"Error handling fetch precision data requested: {e}"
             logger.critical(error_msg, exc_info=True)
+
+    def stop(self, *args, **kwargs) -> None:
+        """Stops the worker thread, then the fetch pools (pending fetches are cancelled)."""
+        super().stop(*args, **kwargs)
+        self._coingecko_executor.shutdown(wait=True, cancel_futures=True)
+        self._executor.shutdown(wait=True, cancel_futures=True)
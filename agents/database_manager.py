@@ -1,9 +1,12 @@
+import itertools
+import queue
 import sqlite3
 import threading
 from datetime import datetime, timezone
 from io import StringIO
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 # noinspection PyPackageRequirements
 from python_pubsub_client import QueueWorkerThread, ServiceBus
@@ -14,14 +17,123 @@ from events import (
     HistoricalPricesFetched,
     PrecisionDataFetched,
     RSICalculated,
-    SingleCoinFetched,
+    TopCoinsSelected,
 )
 from logger import logger
 
 
+def _safe_int(value):
+
+    if value is None:
+        return None
+
+    try:
+        return int(float(value)) if isinstance(value, (float, str)) else value
+    except (ValueError, TypeError):
+        return None
+
+
+def _safe_float(value):
+
+    if value is None:
+        return None
+
+    try:
+        return float(value) if isinstance(value, (int, str)) else value
+    except (ValueError, TypeError):
+        return None
+
+
+def _safe_str(value):
+    return str(value) if value is not None else None
+
+
+def _iso_timestamps(index: pd.DatetimeIndex) -> List[str]:
+    """Formats an index like Timestamp.isoformat(), in a single numpy call for naive or UTC whole-second timestamps."""
+
+    if index.tz is None or str(index.tz) == "UTC":
+        # For a tz-aware index, .values holds the UTC instants.
+        seconds = index.values.astype("datetime64[s]")
+
+        if (seconds == index.values).all():
+            suffix = "" if index.tz is None else "+00:00"
+            return [ts + suffix for ts in np.datetime_as_string(seconds).tolist()]
+    return [ts.isoformat() for ts in index]
+
+
+# CoinGecko market fields stored in the tokens table after (coin_id, coin_symbol, session_guid), in column order.
+_TOKEN_FIELDS = (
+    ('symbol', _safe_str), ('name', _safe_str), ('image', _safe_str), ('current_price', _safe_float),
+    ('market_cap', _safe_int), ('market_cap_rank', _safe_int), ('fully_diluted_valuation', _safe_int), ('total_volume', _safe_int),
+    ('high_24h', _safe_float), ('low_24h', _safe_float), ('price_change_24h', _safe_float), ('price_change_percentage_24h', _safe_float),
+    ('market_cap_change_24h', _safe_int), ('market_cap_change_percentage_24h', _safe_float),
+    ('circulating_supply', _safe_float), ('total_supply', _safe_float), ('max_supply', _safe_float),
+    ('ath', _safe_float), ('ath_change_percentage', _safe_float), ('ath_date', _safe_str),
+    ('atl', _safe_float), ('atl_change_percentage', _safe_float), ('atl_date', _safe_str),
+    ('roi', _safe_str), ('last_updated', _safe_str),
+)
+
+
 class DatabaseManager(QueueWorkerThread):
     """Manages interactions with the SQLite database in its own thread."""
 
+    # Upper bound of tasks per transaction, so a long burst still commits regularly.
+    MAX_BATCH_SIZE = 500
+
+    # Applied in order when the connection opens.
+    _PRAGMAS = (
+        # Only applies to a new database file: it must precede the first write, including the WAL switch.
+        "page_size=8192",
+        # WAL + NORMAL: a commit appends to the write-ahead log without an fsync of the main database file.
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        # 64 MB page cache (negative values are KiB) keeps the indexes hot across batches.
+        "cache_size=-65536",
+        "mmap_size=268435456",
+        "temp_store=MEMORY",
+        # Wait for a reader's checkpoint lock instead of failing the batch with "database is locked".
+        "busy_timeout=5000",
+    )
+
+    _SQL_INSERT_TOKEN = '''
+        INSERT OR REPLACE INTO tokens (
+            coin_id, coin_symbol, session_guid, symbol, name, image, current_price, market_cap, market_cap_rank,
+            fully_diluted_valuation, total_volume, high_24h, low_24h, price_change_24h,
+            price_change_percentage_24h, market_cap_change_24h, market_cap_change_percentage_24h,
+            circulating_supply, total_supply, max_supply, ath, ath_change_percentage,
+            ath_date, atl, atl_change_percentage, atl_date, roi, last_updated
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+
+    '''
+
+    _SQL_INSERT_PRECISION = '''
+        INSERT OR IGNORE INTO precision_data (
+            symbol, quote_asset, base_asset, status, base_asset_precision,
+            step_size, min_qty, tick_size, min_notional, session_guid
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+
+    '''
+
+    _SQL_INSERT_PRICES = '''
+        INSERT OR IGNORE INTO prices
+        (coin_id, coin_symbol, timestamp, session_guid, open, high, low, close, volume, timeframe)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+
+    '''
+
+    _SQL_INSERT_RSI = '''
+        INSERT OR IGNORE INTO rsi (coin_id, coin_symbol, timestamp, session_guid, rsi, timeframe)
+        VALUES (?, ?, ?, ?, ?, ?)
+
+    '''
+
+    _SQL_INSERT_CORRELATION = '''
+        INSERT INTO correlations (coin_id, coin_symbol, run_timestamp, session_guid, correlation, market_cap, low_cap_quartile, timeframe)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+
+    '''
+
     def __init__(self, db_name: str = "crypto_data.db", service_bus: Optional[ServiceBus] = None):
         super().__init__(service_bus=service_bus, name="DatabaseManager")
         self.db_name = db_name
@@ -30,9 +142,22 @@ class DatabaseManager(QueueWorkerThread):
         self.session_guid: Optional[str] = None
         self._initialized_event = threading.Event()  # -- NEW: Synchronization event
 
+        # Tasks the queue may run, bound once instead of resolved with getattr for every task.
+        self._dispatch: Dict[str, Callable[..., None]] = {
+            "_db_save_precision_data": self._db_save_precision_data,
+            "_db_save_tokens": self._db_save_tokens,
+            "_db_save_prices": self._db_save_prices,
+            "_db_save_rsi": self._db_save_rsi,
+            "_db_save_correlation": self._db_save_correlation,
+        }
+        # Tasks whose consecutive calls in a batch are run as one executemany, given the args of every call.
+        self._bulk_dispatch: Dict[str, Callable[[List[tuple]], None]] = {
+            "_db_save_correlation": self._db_save_correlation_calls,
+        }
+
     def setup_event_subscriptions(self) -> None:
         self.service_bus.subscribe("AnalysisConfigurationProvided", self._handle_configuration_provided)
-        self.service_bus.subscribe("SingleCoinFetched", self._handle_single_coin_fetched)
+        self.service_bus.subscribe("TopCoinsSelected", self._handle_top_coins_selected)
         self.service_bus.subscribe("HistoricalPricesFetched", self._handle_historical_prices_fetched)
         self.service_bus.subscribe("RSICalculated", self._handle_rsi_calculated)
         self.service_bus.subscribe("CorrelationAnalyzed", self._handle_correlation_analyzed)
@@ -47,13 +172,13 @@ class DatabaseManager(QueueWorkerThread):
             error_msg = f"Error handling configuration provided: {e}"
             logger.critical(error_msg, exc_info=True)
 
-    def _handle_single_coin_fetched(self, event: SingleCoinFetched):
+    def _handle_top_coins_selected(self, event: TopCoinsSelected):
 
         try:
-            if event.coin:
-                self.add_task("_db_save_token", event.coin, self.session_guid)
+            if event.coins:
+                self.add_task("_db_save_tokens", event.coins, self.session_guid)
         except Exception as e:
-            error_msg = f"Error handling single coin fetched: {e}"
+            error_msg = f"Error handling top coins selected: {e}"
             logger.critical(error_msg, exc_info=True)
 
     def _handle_historical_prices_fetched(self, event: HistoricalPricesFetched):
@@ -65,7 +190,9 @@ class DatabaseManager(QueueWorkerThread):
             prices_df = pd.read_json(StringIO(event.prices_df_json), orient="split")
             prices_df.index = pd.to_datetime(prices_df.index, unit="ms", utc=True)
             if prices_df is not None and not prices_df.empty:
-                self.add_task("_db_save_prices", event.coin_id_symbol, prices_df, self.session_guid, event.timeframe)
+                # Timestamps are formatted here, on the publishing thread, leaving only the inserts to the database thread.
+                timestamps = _iso_timestamps(prices_df.index)
+                self.add_task("_db_save_prices", event.coin_id_symbol, prices_df, self.session_guid, event.timeframe, timestamps)
         except Exception as e:
             error_msg = f"Cannot reconstruct price DataFrame for {event.coin_id_symbol}: {e}"
             logger.error(error_msg)
@@ -106,7 +233,7 @@ class DatabaseManager(QueueWorkerThread):
     def _handle_precision_data_fetched(self, event: PrecisionDataFetched):
 
         try:
-            if event.precision_data:
+            if event.precision_data.get("symbol"):
                 self.add_task("_db_save_precision_data", event.precision_data, self.session_guid)
         except Exception as e:
             error_msg = f"Error handling precision data fetched: {e}"
@@ -115,18 +242,104 @@ class DatabaseManager(QueueWorkerThread):
     def run(self):
         self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self._configure_connection()
         self._initialize_tables()
         self._initialized_event.set()
 
-        # Call the parent class run() method to manage the work loop
-        super().run()
+        self._process_work_queue()
 
         self._close()
 
+    def _process_work_queue(self) -> None:
+        """
+        Work loop of QueueWorkerThread.run, draining every queued task on each wakeup.
+
+        A burst of events (one per coin) is then handled as one batch instead of one
+        blocking get per task.
+        """
+        logger.info(f"Thread '{self.name}' started.")
+
+        while self._running:
+            try:
+                batch = [self.work_queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+
+            while len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    batch.append(self.work_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop_requested = self._run_batch(batch)
+            if stop_requested:
+                break
+
+    def _run_batch(self, batch: List[Optional[Tuple[str, tuple, dict]]]) -> bool:
+        """
+        Runs the tasks of a batch in order inside a single transaction.
+
+        Consecutive tasks of a method listed in _bulk_dispatch are folded into one executemany.
+        The save methods do not commit: the batch is committed once, then its tasks are marked done,
+        so wait_for_queue_completion only returns once their rows are visible to other connections.
+
+        Returns:
+            True if the stop sentinel was reached.
+        """
+        stop_requested = None in batch
+        tasks = batch[:batch.index(None)] if stop_requested else batch
+
+        try:
+            for method_name, group in itertools.groupby(tasks, key=lambda task: task[0]):
+                calls = list(group)
+                bulk = self._bulk_dispatch.get(method_name)
+                if bulk is not None and len(calls) > 1 and not any(kwargs for _, _, kwargs in calls):
+                    try:
+                        bulk([args for _, args, _ in calls])
+                        continue
+                    except Exception as e:
+                        # Falls through to the per-task calls: an error must not end the database thread.
+                        error_msg = f"Error running grouped database task {method_name}, running its tasks one by one: {e}"
+                        logger.error(error_msg, exc_info=True)
+                        self.log_message(error_msg)
+
+                for _, args, kwargs in calls:
+                    try:
+                        self._dispatch[method_name](*args, **kwargs)
+                    except Exception as e:
+                        error_msg = f"Error running database task {method_name}: {e}"
+                        logger.error(error_msg, exc_info=True)
+                        self.log_message(error_msg)
+
+            self._commit()
+        finally:
+            for _ in batch:
+                self.work_queue.task_done()
+        return stop_requested
+
+    def _commit(self) -> None:
+
+        try:
+            self.conn.commit()
+        except Exception as e:
+            error_msg = f"Error committing database batch: {e}"
+            logger.error(error_msg, exc_info=True)
+            self.log_message(error_msg)
+            self.conn.rollback()
+
+    def _configure_connection(self) -> None:
+
+        for pragma in self._PRAGMAS:
+            # An in-memory database has no file to journal.
+            if pragma.startswith("journal_mode") and self.db_name == ":memory:":
+                continue
+            self.cursor.execute(f"PRAGMA {pragma}")
+
     def _initialize_tables(self) -> None:
 
         try:
-            self.cursor.execute(
+            # The whole schema is applied as one script: every statement is idempotent.
+            self.cursor.executescript(
                 """
                 CREATE TABLE IF NOT EXISTS tokens (
                     coin_id TEXT, coin_symbol TEXT, session_guid TEXT, symbol TEXT, name TEXT, image TEXT,
@@ -137,44 +350,41 @@ class DatabaseManager(QueueWorkerThread):
                     max_supply REAL, ath REAL, ath_change_percentage REAL, ath_date TEXT, atl REAL,
                     atl_change_percentage REAL, atl_date TEXT, roi TEXT, last_updated TEXT,
                     PRIMARY KEY (coin_id, session_guid)
-                )
-                """
-            )
-            self.cursor.execute(
-                """
+                );
+
                 CREATE TABLE IF NOT EXISTS prices (
                     coin_id TEXT, coin_symbol TEXT, timestamp TIMESTAMP, session_guid TEXT,
                     open REAL, high REAL, low REAL, close REAL, volume REAL, timeframe TEXT,
                     PRIMARY KEY (coin_id, timestamp, session_guid, timeframe)
-                )
-                """
-            )
-            self.cursor.execute(
-                """
+                );
+
                 CREATE TABLE IF NOT EXISTS rsi (
                     coin_id TEXT, coin_symbol TEXT, timestamp TIMESTAMP, session_guid TEXT, rsi REAL, timeframe TEXT,
                     PRIMARY KEY (coin_id, timestamp, session_guid, timeframe)
-                )
-                """
-            )
-            self.cursor.execute(
-                """
+                );
+
                 CREATE TABLE IF NOT EXISTS correlations (
                     coin_id TEXT, coin_symbol TEXT, run_timestamp TIMESTAMP, session_guid TEXT,
                     correlation REAL, market_cap REAL, low_cap_quartile BOOLEAN, timeframe TEXT,
                     PRIMARY KEY (coin_id, run_timestamp, session_guid, timeframe)
-                )
-                """
-            )
-            self.cursor.execute(
-                """
+                );
+
                 CREATE TABLE IF NOT EXISTS precision_data (
                     symbol TEXT, quote_asset TEXT NOT NULL, base_asset TEXT NOT NULL,
                     status BOOLEAN NOT NULL, base_asset_precision INTEGER NOT NULL, step_size REAL NOT NULL,
                     min_qty REAL NOT NULL, tick_size REAL NOT NULL, min_notional REAL NOT NULL,
                     session_guid TEXT,
                     PRIMARY KEY (symbol, session_guid)
-                )
+                );
+
+                -- Nothing reads prices or rsi by session: an index there would only slow the two busiest inserts.
+                -- Dropped from databases created while they existed.
+                DROP INDEX IF EXISTS idx_prices_session_tf_coin;
+                DROP INDEX IF EXISTS idx_rsi_session_tf_coin;
+                -- Analyses read a whole session/timeframe at once, which the (coin_id, ...) primary key cannot serve.
+                CREATE INDEX IF NOT EXISTS idx_correlations_session_tf ON correlations (session_guid, timeframe, run_timestamp);
+                -- Latest runs of a session across timeframes.
+                CREATE INDEX IF NOT EXISTS idx_correlations_session_ts ON correlations (session_guid, run_timestamp DESC);
                 """
             )
             self.conn.commit()
@@ -184,42 +394,45 @@ class DatabaseManager(QueueWorkerThread):
             self.log_message(error_msg)
             raise
 
-    def _db_save_precision_data(self, precision_data: List[Dict], session_guid: str) -> None:
+    def _db_save_precision_data(self, precision_data: Dict[str, List], session_guid: str) -> None:
 
         try:
-            data_to_insert = [
-                (
-                    data.get("symbol"),
-                    data.get("quote_asset"),
-                    data.get("base_asset"),
-                    data.get("status"),
-                    data.get("base_asset_precision"),
-                    float(data.get("step_size", "0")),
-                    float(data.get("min_qty", "0")),
-                    float(data.get("tick_size", "0")),
-                    float(data.get("min_notional", "0")),
-                    session_guid,
-                )
-                for data in precision_data
-            ]
-            if not data_to_insert:
+            symbols = precision_data.get("symbol", [])
+            if not symbols:
                 return
+            missing = [None] * len(symbols)
+
+            def as_floats(column: str) -> List[float]:
+                return [float(value if value is not None else "0") for value in precision_data.get(column, missing)]
+
+            # Rows streamed to executemany by zipping the columns of the payload.
+            data_to_insert = zip(
+                symbols,
+                precision_data.get("quote_asset", missing),
+                precision_data.get("base_asset", missing),
+                precision_data.get("status", missing),
+                precision_data.get("base_asset_precision", missing),
+                as_floats("step_size"),
+                as_floats("min_qty"),
+                as_floats("tick_size"),
+                as_floats("min_notional"),
+                itertools.repeat(session_guid),
+            )
 
-            sql = """
-                INSERT OR IGNORE INTO precision_data (
-                    symbol, quote_asset, base_asset, status, base_asset_precision,
-                    step_size, min_qty, tick_size, min_notional, session_guid
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-
-            """
-            self.cursor.executemany(sql, data_to_insert)
-            self.conn.commit()
-            logger.info(f"{len(data_to_insert)} precision records inserted into database.")
+            self.cursor.executemany(self._SQL_INSERT_PRECISION, data_to_insert)
+            logger.info(f"{len(symbols)} precision records inserted into database.")
         except Exception as e:
             error_msg = f"Error saving precision data: {e}"
             logger.error(error_msg, exc_info=True)
             self.log_message(error_msg)
 
+    @staticmethod
+    def _token_values(coin: Dict, session_guid: Optional[str]) -> Tuple:
+        """Builds the tokens table row for one CoinGecko market entry."""
+        return (coin.get('id'), coin.get('symbol', '').upper(), session_guid) + tuple(
+            convert(coin.get(key)) for key, convert in _TOKEN_FIELDS
+        )
+
     def _db_save_token(self, coin: Dict, session_guid: Optional[str]) -> None:
         coin_id = coin.get('id')
 
@@ -230,79 +443,48 @@ class DatabaseManager(QueueWorkerThread):
                 self.log_message(error_msg)
                 return
 
-            def safe_int(value):
-                if value is None:
-                    return None
-                try:
-                    return int(float(value)) if isinstance(value, (float, str)) else value
-                except (ValueError, TypeError):
-                    return None
-
-            def safe_float(value):
-                if value is None:
-                    return None
-                try:
-                    return float(value) if isinstance(value, (int, str)) else value
-                except (ValueError, TypeError):
-                    return None
-
-            def safe_str(value):
-                return str(value) if value is not None else None
-
-            values = (
-                coin_id, coin.get('symbol', '').upper(), session_guid, safe_str(coin.get('symbol')), safe_str(coin.get('name')),
-                safe_str(coin.get('image')), safe_float(coin.get('current_price')),
-                safe_int(coin.get('market_cap')), safe_int(coin.get('market_cap_rank')),
-                safe_int(coin.get('fully_diluted_valuation')), safe_int(coin.get('total_volume')),
-                safe_float(coin.get('high_24h')), safe_float(coin.get('low_24h')),
-                safe_float(coin.get('price_change_24h')), safe_float(coin.get('price_change_percentage_24h')),
-                safe_int(coin.get('market_cap_change_24h')), safe_float(coin.get('market_cap_change_percentage_24h')),
-                safe_float(coin.get('circulating_supply')), safe_float(coin.get('total_supply')),
-                safe_float(coin.get('max_supply')), safe_float(coin.get('ath')),
-                safe_float(coin.get('ath_change_percentage')), safe_str(coin.get('ath_date')),
-                safe_float(coin.get('atl')), safe_float(coin.get('atl_change_percentage')),
-                safe_str(coin.get('atl_date')), safe_str(coin.get('roi')), safe_str(coin.get('last_updated'))
-            )
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO tokens (
-                    coin_id, coin_symbol, session_guid, symbol, name, image, current_price, market_cap, market_cap_rank,
-                    fully_diluted_valuation, total_volume, high_24h, low_24h, price_change_24h,
-                    price_change_percentage_24h, market_cap_change_24h, market_cap_change_percentage_24h,
-                    circulating_supply, total_supply, max_supply, ath, ath_change_percentage,
-                    ath_date, atl, atl_change_percentage, atl_date, roi, last_updated
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-
-            ''', values)
-            self.conn.commit()
+            self.cursor.execute(self._SQL_INSERT_TOKEN, self._token_values(coin, session_guid))
             logger.info(f"Token {coin_id} saved with session_guid={session_guid}.")
         except Exception as e:
             error_msg = f"Error saving token {coin_id}: {e}"
             logger.error(error_msg)
             self.log_message(error_msg)
 
-    def _db_save_prices(self, coin_id_symbol: Tuple[str, str], prices_df: pd.DataFrame, session_guid: Optional[str], timeframe: str) -> None:
+    def _db_save_tokens(self, coins: List[Dict], session_guid: Optional[str]) -> None:
+        # Each coin is checked on its own: a malformed entry only skips that coin.
+        valid_calls, data_to_insert = [], []
+
+        for coin in coins:
+            try:
+                if not coin.get('id'):
+                    raise ValueError("missing 'id' key")
+                data_to_insert.append(self._token_values(coin, session_guid))
+                valid_calls.append((coin, session_guid))
+            except Exception as e:
+                error_msg = f"Skipping malformed token payload: {e}"
+                logger.error(error_msg)
+                self.log_message(error_msg)
+
+        if data_to_insert and self._bulk_insert(self._SQL_INSERT_TOKEN, data_to_insert, self._db_save_token, valid_calls):
+            logger.info(f"{len(data_to_insert)} tokens saved with session_guid={session_guid}.")
+
+    def _db_save_prices(self, coin_id_symbol: Tuple[str, str], prices_df: pd.DataFrame, session_guid: Optional[str], timeframe: str,
+                        timestamps: Optional[List[str]] = None) -> None:
         coin_id, coin_symbol = coin_id_symbol
 
         try:
             if prices_df.empty:
                 return
 
+            if timestamps is None:
+                timestamps = _iso_timestamps(prices_df.index)
+            ohlcv = prices_df[["open", "high", "low", "close", "volume"]].to_numpy(dtype="float64").tolist()
             data_to_insert = [
-                (coin_id, coin_symbol, ts.isoformat(), session_guid, row.open, row.high, row.low, row.close, row.volume, timeframe)
-                for ts, row in prices_df.iterrows()
+                (coin_id, coin_symbol, ts, session_guid, o, h, l, c, v, timeframe)
+                for ts, (o, h, l, c, v) in zip(timestamps, ohlcv)
             ]
-            if not data_to_insert:
-                return
 
-            sql = """
-                INSERT OR IGNORE INTO prices
-                (coin_id, coin_symbol, timestamp, session_guid, open, high, low, close, volume, timeframe)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-
-            """
-            self.cursor.executemany(sql, data_to_insert)
-            self.conn.commit()
+            self.cursor.executemany(self._SQL_INSERT_PRICES, data_to_insert)
             logger.info(f"{len(data_to_insert)} prices for {coin_id} saved (session={session_guid}).")
         except Exception as e:
             error_msg = f"Error bulk saving prices for {coin_id}: {e}"
@@ -316,20 +498,15 @@ class DatabaseManager(QueueWorkerThread):
             if rsi_series.empty:
                 return
 
+            valid = rsi_series.dropna()
             data_to_insert = [
-                (coin_id, coin_symbol, ts.to_pydatetime().isoformat(), session_guid, rsi_value, timeframe)
-                for ts, rsi_value in rsi_series.items() if not pd.isna(rsi_value)
+                (coin_id, coin_symbol, ts, session_guid, rsi_value, timeframe)
+                for ts, rsi_value in zip(_iso_timestamps(valid.index), valid.to_numpy(dtype="float64").tolist())
             ]
             if not data_to_insert:
                 return
 
-            sql = """
-                INSERT OR IGNORE INTO rsi (coin_id, coin_symbol, timestamp, session_guid, rsi, timeframe)
-                VALUES (?, ?, ?, ?, ?, ?)
-
-            """
-            self.cursor.executemany(sql, data_to_insert)
-            self.conn.commit()
+            self.cursor.executemany(self._SQL_INSERT_RSI, data_to_insert)
             logger.info(f"{len(data_to_insert)} RSI for {coin_id} saved (session={session_guid}).")
         except Exception as e:
             error_msg = f"Error bulk saving RSI for {coin_id}: {e}"
@@ -342,33 +519,83 @@ class DatabaseManager(QueueWorkerThread):
         coin_id, coin_symbol = coin_id_symbol
 
         try:
-            self.cursor.execute('''
-                INSERT INTO correlations (coin_id, coin_symbol, run_timestamp, session_guid, correlation, market_cap, low_cap_quartile, timeframe)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-
-            ''', (coin_id, coin_symbol, run_timestamp, session_guid, correlation, market_cap, low_cap_quartile, timeframe))
-            self.conn.commit()
+            self.cursor.execute(
+                self._SQL_INSERT_CORRELATION, (coin_id, coin_symbol, run_timestamp, session_guid, correlation, market_cap, low_cap_quartile, timeframe)
+            )
             logger.info(f"Correlation for {coin_id} saved with session_guid={session_guid}.")
         except Exception as e:
             error_msg = f"Error saving correlation for {coin_id}: {e}"
             logger.error(error_msg)
             self.log_message(error_msg)
 
+    def _db_save_correlation_calls(self, calls: List[tuple]) -> None:
+        """Saves the results of consecutive _db_save_correlation tasks with a single executemany."""
+        valid_calls, data_to_insert = [], []
+
+        for call in calls:
+            try:
+                (coin_id, coin_symbol), run_timestamp, correlation, market_cap, low_cap_quartile, session_guid, timeframe = call
+                data_to_insert.append((coin_id, coin_symbol, run_timestamp, session_guid, correlation, market_cap, low_cap_quartile, timeframe))
+                valid_calls.append(call)
+            except Exception as e:
+                error_msg = f"Skipping malformed correlation task: {e}"
+                logger.error(error_msg)
+                self.log_message(error_msg)
+
+        if data_to_insert and self._bulk_insert(self._SQL_INSERT_CORRELATION, data_to_insert, self._db_save_correlation, valid_calls):
+            logger.info(f"{len(data_to_insert)} correlations saved.")
+
+    def _bulk_insert(self, sql: str, data_to_insert: List[tuple], fallback: Callable[..., None], calls: List[tuple]) -> bool:
+        """
+        Inserts the rows of grouped tasks with one executemany inside a savepoint.
+
+        If any row fails, whatever the exception, the savepoint is rolled back and every call is
+        replayed through fallback, the one-row save method, so only the failing tasks are lost.
+
+        Returns:
+            True if the bulk insert succeeded.
+        """
+        # The savepoint must nest in the batch transaction: released on its own, it would commit.
+
+        if not self.conn.in_transaction:
+            self.cursor.execute("BEGIN")
+        self.cursor.execute("SAVEPOINT bulk_insert")
+
+        try:
+            self.cursor.executemany(sql, data_to_insert)
+        except Exception as e:
+            # Not only sqlite3.Error: binding a value SQLite cannot store raises OverflowError.
+            self.cursor.execute("ROLLBACK TO bulk_insert")
+            self.cursor.execute("RELEASE bulk_insert")
+            logger.warning(f"Bulk insert for {fallback.__name__} failed ({e}), saving its {len(calls)} rows one by one.")
+
+            for args in calls:
+                try:
+                    fallback(*args)
+                except Exception as call_error:
+                    error_msg = f"Error running database task {fallback.__name__}: {call_error}"
+                    logger.error(error_msg, exc_info=True)
+                    self.log_message(error_msg)
+            return False
+
+        self.cursor.execute("RELEASE bulk_insert")
+        return True
+
     def wait_for_queue_completion(self, timeout: float = 30.0) -> bool:
         """Wait for all tasks in the queue to be processed."""
         import time
 
         start_time = time.time()
 
-        while not self.work_queue.empty():
+        # Tasks are drained in batches: an empty queue does not mean they have run, unfinished_tasks does.
+
+        while self.work_queue.unfinished_tasks:
             if time.time() - start_time > timeout:
-                logger.warning(f"Timeout waiting for DatabaseManager queue to empty. {self.work_queue.qsize()} tasks remaining.")
+                logger.warning(f"Timeout waiting for DatabaseManager queue to empty. {self.work_queue.unfinished_tasks} tasks remaining.")
                 return False
 
             time.sleep(0.1)
 
-        # Wait a bit more to ensure last task is fully processed
-        time.sleep(0.2)
         logger.info("DatabaseManager queue is empty. All tasks processed.")
         return True
 
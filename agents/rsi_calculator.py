@@ -1,16 +1,42 @@
-from io import StringIO
+import json
 from typing import Optional, Tuple
 
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 # noinspection PyPackageRequirements
 from python_pubsub_client import QueueWorkerThread, ServiceBus
 from python_threadsafe_logger import sqlite_business_logger
 
-from events import AnalysisConfigurationProvided, CalculateRSIRequested, RSICalculated
+from events import AnalysisConfigurationProvided, HistoricalPricesFetched, RSICalculated
 from logger import logger
 
 
+def rsi_values(closes: np.ndarray, periods: int) -> np.ndarray:
+    """
+    Computes the simple moving average RSI of a close price array.
+
+    Args:
+        closes: 1D array of close prices, without NaN.
+        periods: RSI window length.
+
+    Returns:
+        1D array of len(closes) - periods + 1 RSI values, the first one ending at closes[periods - 1].
+    """
+    # The first delta has no predecessor and counts as neither a gain nor a loss.
+    delta = np.diff(closes, prepend=closes[0])
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+
+    avg_gain = sliding_window_view(gains, periods).mean(axis=1)
+    avg_loss = sliding_window_view(losses, periods).mean(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    rsi[avg_loss == 0] = 100
+    return rsi
+
+
 class RSICalculator(QueueWorkerThread):
     """Calculates RSI for a price series in its own thread."""
 
@@ -21,7 +47,8 @@ class RSICalculator(QueueWorkerThread):
 
     def setup_event_subscriptions(self) -> None:
         self.service_bus.subscribe("AnalysisConfigurationProvided", self._handle_configuration_provided)
-        self.service_bus.subscribe("CalculateRSIRequested", self._handle_calculate_rsi_requested)
+        # Prices go straight to the RSI stage, without an extra hop through the orchestrator.
+        self.service_bus.subscribe("HistoricalPricesFetched", self._handle_historical_prices_fetched)
 
     def _handle_configuration_provided(self, event: AnalysisConfigurationProvided):
 
@@ -35,28 +62,37 @@ class RSICalculator(QueueWorkerThread):
             error_msg = f"Error handling configuration provided: {e}"
             logger.critical(error_msg, exc_info=True)
 
-    def _handle_calculate_rsi_requested(self, event: CalculateRSIRequested):
+    def _handle_historical_prices_fetched(self, event: HistoricalPricesFetched):
 
         try:
-            prices_series = self._deserialize_prices_series(event.prices_series_json, event.coin_id_symbol)
+            # A missing or empty price frame yields None, reported as CoinProcessingFailed by the task.
+            prices_series = self._deserialize_close_series(event.prices_df_json, event.coin_id_symbol)
             self.add_task("_calculate_rsi_task", event.coin_id_symbol, prices_series, event.timeframe)
 
         except Exception as e:
-            error_msg = f"Error handling calculate RSI requested: {e}"
+            error_msg = f"Error handling historical prices fetched: {e}"
             logger.critical(error_msg, exc_info=True)
 
-    def _deserialize_prices_series(self, prices_json: Optional[str], coin_id_symbol: Tuple[str, str]) -> Optional[pd.Series]:
+    def _deserialize_close_series(self, prices_json: Optional[str], coin_id_symbol: Tuple[str, str]) -> Optional[pd.Series]:
 
         if not prices_json:
             return None
 
         try:
-            prices_series = pd.read_json(StringIO(prices_json), orient="split", typ="series")
-            prices_series.index = pd.to_datetime(prices_series.index, unit="ms", utc=True)
-            return prices_series
+            # The payload carries the full OHLCV frame for the database; only the close column
+            # is needed here, so it is read straight from the split JSON without a DataFrame.
+            payload = json.loads(prices_json)
+            rows = payload.get("data") or []
+            if not rows:
+                return None
+
+            close_pos = payload["columns"].index("close")
+            close = np.array([row[close_pos] for row in rows], dtype=np.float64)
+            index = pd.to_datetime(np.asarray(payload["index"], dtype=np.int64), unit="ms", utc=True)
+            return pd.Series(close, index=index, name="close")
 
         except Exception as e:
-            error_msg = f"Cannot reconstruct price Series for {coin_id_symbol}: {e}"
+            error_msg = f"Cannot reconstruct price DataFrame for {coin_id_symbol}: {e}"
             logger.error(error_msg)
             self.log_message(error_msg)
             return None
@@ -81,15 +117,9 @@ class RSICalculator(QueueWorkerThread):
                 calculation_failed = True
 
             else:
-                valid_data = data.dropna().astype(float)
-                delta = valid_data.diff()
-                gain = (delta.where(delta > 0, 0)).rolling(window=self.periods).mean()
-                loss = (-delta.where(delta < 0, 0)).rolling(window=self.periods).mean()
-                rs = gain / loss
-                rs[loss == 0] = np.inf
-                rsi_series = 100 - (100 / (1 + rs))
-                rsi_series[rs == np.inf] = 100
-                rsi_series = rsi_series.dropna()
+                valid_data = data.dropna()
+                rsi = rsi_values(valid_data.to_numpy(dtype=np.float64), self.periods)
+                rsi_series = pd.Series(rsi, index=valid_data.index[self.periods - 1:])
 
             if rsi_series is not None and not rsi_series.empty:
                 rsi_json = rsi_series.to_json(orient="split")
@@ -1,6 +1,7 @@
 import threading
 from typing import List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 # noinspection PyPackageRequirements
 from python_pubsub_client import IdempotencyTracker
@@ -8,6 +9,9 @@ from python_threadsafe_logger import sqlite_business_logger
 
 from logger import logger
 
+# Reference coin every other coin is correlated with, as (ID, Symbol).
+BTC = ("bitcoin", "btc")
+
 
 class AnalysisJob:
     """Contains the state of an analysis for a single timeframe."""
@@ -15,14 +19,20 @@ class AnalysisJob:
     def __init__(self, timeframe: str, parent_analyzer):
         self.timeframe = timeframe
         self.analyzer = parent_analyzer
-        self.btc_rsi: Optional[pd.Series] = None
         self.coins_to_process: List[Tuple[str, str]] = []
+        self.market_caps: np.ndarray = np.empty(0, dtype=np.float64)
         self._processing_counter = 0
         self._counter_lock = threading.Lock()
         self._idempotency_tracker = IdempotencyTracker(maxlen=1000)
 
     def set_coins_to_process(self, coins: List[Tuple[str, str]]):
-        self.coins_to_process = [c for c in coins if c[1].lower() != "btc"]
+        # Symbols are lowercased once upstream by the analyzer.
+        self.coins_to_process = [c for c in coins if c[1] != BTC[1]]
+        # Market caps resolved once, aligned with coins_to_process, instead of a dict probe per correlation.
+        market_caps = self.analyzer.market_caps
+        self.market_caps = np.array([market_caps.get(symbol, 0) for _, symbol in self.coins_to_process], dtype=np.float64)
+        # One slot per coin plus one for BTC. The counter is primed before any price fetch is
+        # requested for this timeframe, so no completion can reach it before it is set.
         with self._counter_lock:
             self._processing_counter = len(self.coins_to_process) + 1
 
@@ -33,39 +43,52 @@ class AnalysisJob:
         Args:
             coin_id_symbol: Optional coin identifier for idempotency tracking
         """
+        timeframe = self.timeframe
+        tracker = self._idempotency_tracker
+
         # Create event data for idempotency check
         event_data = {
-            "timeframe": self.timeframe,
+            "timeframe": timeframe,
             "coin_id_symbol": coin_id_symbol,
             "event_type": "decrement"
         }
 
         # Check if we've already processed this decrement
 
-        if self._idempotency_tracker.is_duplicate(event_data):
+        if tracker.is_duplicate(event_data):
             logger.debug(
-                f"[IDEMPOTENCY] Duplicate decrement detected for {coin_id_symbol} on {self.timeframe}. Skipping."
+                f"[IDEMPOTENCY] Duplicate decrement detected for {coin_id_symbol} on {timeframe}. Skipping."
             )
             return
 
         # Mark as processed and proceed with decrement
-        self._idempotency_tracker.mark_processed(event_data)
+        tracker.mark_processed(event_data)
 
+        # The lock only covers the decrement itself: logging and the correlation pass run outside it,
+        # so concurrent completions are never serialized behind them.
         with self._counter_lock:
             self._processing_counter -= 1
-            logger.debug(f"[CORRELATION-DEBUG] Counter for {self.timeframe}: {self._processing_counter}")
+            remaining = self._processing_counter
 
-            if self._processing_counter <= 0:
-                logger.info(
-                    f"All RSI for timeframe {self.timeframe} have been processed. Starting correlations."
-                )
-                self.start_correlation_analysis()
+        # Lazy %-formatting: nothing is formatted per completion unless DEBUG is enabled.
+        logger.debug("[CORRELATION-DEBUG] Counter for %s: %d", timeframe, remaining)
+
+        # Exactly one caller observes the transition to zero.
+
+        if remaining == 0:
+            logger.info(
+                f"All RSI for timeframe {timeframe} have been processed. Starting correlations."
+            )
+            self.start_correlation_analysis()
 
     def start_correlation_analysis(self):
         """Starts correlation analysis for all processed coins in this job."""
 
         try:
-            if self.btc_rsi is None:
+            # BTC is stored in rsi_results like any other coin: no separate handoff field.
+            btc_rsi = self.analyzer.rsi_results.get((*BTC, self.timeframe))
+
+            if btc_rsi is None:
                 logger.error(f"Cannot start analysis for {self.timeframe}: BTC RSI missing.")
 
                 if self.analyzer.service_bus is not None:
@@ -73,18 +96,17 @@ class AnalysisJob:
 
                 return
 
-            for coin_id, symbol in self.coins_to_process:
-                try:
-                    rsi_key = (coin_id, symbol, self.timeframe)
-                    coin_rsi = self.analyzer.rsi_results.get(rsi_key)
+            # One (time, coins) matrix aligned on the BTC timestamps, BTC as the last column,
+            # so all correlations are computed in a single vectorized pass.
+            rsi_results = self.analyzer.rsi_results
+            positions = [
+                pos for pos, (coin_id, symbol) in enumerate(self.coins_to_process) if (coin_id, symbol, self.timeframe) in rsi_results
+            ]
+            coins = [self.coins_to_process[pos] for pos in positions]
 
-                    if coin_rsi is not None:
-                        self.analyzer.analyze_correlation(
-                            coin_id_symbol=(coin_id, symbol), coin_rsi=coin_rsi, btc_rsi=self.btc_rsi, timeframe=self.timeframe
-                        )
-                except Exception as e:
-                    logger.error(f"Error analyzing correlation for {coin_id}/{symbol} on {self.timeframe}: {e}", exc_info=True)
-                    # Continue with next coin instead of stopping
+            if coins:
+                rsi_matrix = self._build_rsi_matrix([rsi_results[(coin_id, symbol, self.timeframe)] for coin_id, symbol in coins], btc_rsi)
+                self.analyzer.analyze_correlations(coins, rsi_matrix, self.timeframe, self.market_caps[positions])
 
             sqlite_business_logger.log(self.__class__.__name__, f"AnalysisJobCompleted for {self.timeframe}")
 
@@ -96,3 +118,24 @@ class AnalysisJob:
 
             if self.analyzer.service_bus is not None:
                 self.analyzer.service_bus.publish("AnalysisJobCompleted", {"timeframe": self.timeframe}, self.__class__.__name__)
+
+    @staticmethod
+    def _build_rsi_matrix(coin_rsis: List[pd.Series], btc_rsi: pd.Series) -> np.ndarray:
+        """
+        Aligns the coin RSI series on the BTC timestamps, without building per-coin intersections.
+
+        Returns:
+            (len(btc_rsi), len(coin_rsis) + 1) array, NaN where a coin has no value, BTC in the last column.
+        """
+        btc_index = btc_rsi.index
+        rsi_matrix = np.full((len(btc_index), len(coin_rsis) + 1), np.nan)
+        rsi_matrix[:, -1] = btc_rsi.to_numpy(dtype=np.float64)
+
+        # get_indexer reuses the hash table of the BTC index, built once for all coins.
+
+        for col, coin_rsi in enumerate(coin_rsis):
+            positions = btc_index.get_indexer(coin_rsi.index)
+            found = positions >= 0
+            rsi_matrix[positions[found], col] = coin_rsi.to_numpy(dtype=np.float64)[found]
+
+        return rsi_matrix
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -10,4 +10,12 @@ class AnalysisConfig(BaseModel):
     rsi_period: int = Field(14, gt=1, description="La période pour le calcul du RSI.")
     timeframes: List[str] = Field(default_factory=lambda: ["1d"])
     low_cap_percentile: float = Field(25.0, ge=0.0, le=100.0, description="Le percentile pour définir la 'faible capitalisation'.")
+    fetch_concurrency: int = Field(
+        8, gt=0, le=32,
+        description="Nombre maximal de requêtes OHLCV simultanées. À garder proche de ce que la limite de débit de l'exchange absorbe : "
+                    "au-delà, les threads supplémentaires ne font qu'attendre le rate limiter."
+    )
+    ohlcv_cache_dir: Optional[str] = Field(
+        None, description="Répertoire du cache disque des bougies OHLCV : seules les bougies manquantes sont récupérées. Désactivé si None."
+    )
     pubsub_url: str = Field(default="http://localhost:5000")
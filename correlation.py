@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def pearson_btc_row(aligned_matrix: np.ndarray, btc_col: int) -> np.ndarray:
+    """
+    Computes the Pearson correlation of every column of an aligned (time, coins) matrix
+    against the BTC column, with whole-matrix NumPy operations.
+
+    NaN entries are excluded pairwise, like Series.corr: each column is correlated with BTC
+    over the rows where both values are present.
+
+    Args:
+        aligned_matrix: 2D array of RSI values, one row per timestamp and one column per coin.
+        btc_col: Index of the BTC column.
+
+    Returns:
+        1D array with one correlation per column (NaN for constant or empty columns); the BTC entry is 1.0.
+    """
+    btc = aligned_matrix[:, btc_col]
+    valid = ~np.isnan(aligned_matrix) & ~np.isnan(btc)[:, np.newaxis]
+    complete = valid.all(axis=0)
+    correlations = np.empty(aligned_matrix.shape[1])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Columns covering every BTC timestamp share one centered, normalized BTC vector,
+        # computed once instead of once per coin.
+
+        if complete.any():
+            btc_centered = btc - btc.mean()
+            btc_unit = btc_centered / np.sqrt(btc_centered @ btc_centered)
+            # Boolean indexing already returns a copy: center it in place, without another temporary.
+            x = aligned_matrix[:, complete]
+            x -= x.mean(axis=0)
+            correlations[complete] = (btc_unit @ x) / np.sqrt(np.einsum("ij,ij->j", x, x))
+
+        # Columns with gaps need their own BTC mean over the rows they share with it.
+
+        if not complete.all():
+            partial = ~complete
+            correlations[partial] = _pairwise_pearson(aligned_matrix[:, partial], btc, valid[:, partial])
+
+    return correlations
+
+
+def _pairwise_pearson(matrix: np.ndarray, btc: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Pearson correlation of each column with btc over the rows flagged in valid."""
+    counts = valid.sum(axis=0)
+    x = np.where(valid, matrix, 0.0)
+    y = np.where(valid, btc[:, np.newaxis], 0.0)
+
+    # Center in place, then zero the missing entries again by multiplying with the mask.
+    x -= x.sum(axis=0) / counts
+    y -= y.sum(axis=0) / counts
+    np.multiply(x, valid, out=x)
+    np.multiply(y, valid, out=y)
+
+    return np.einsum("ij,ij->j", x, y) / np.sqrt(np.einsum("ij,ij->j", x, x) * np.einsum("ij,ij->j", y, y))
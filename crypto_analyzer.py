@@ -2,6 +2,7 @@ import threading
 from io import StringIO
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 # noinspection PyPackageRequirements
 from python_pubsub_client import OrchestratorBase, ServiceBus, AllProcessingCompleted, WorkerFailed
@@ -11,21 +12,21 @@ from agents.data_fetcher import DataFetcher
 from agents.database_manager import DatabaseManager
 from agents.display_agent import DisplayAgent
 from agents.rsi_calculator import RSICalculator
-from analysis_job import AnalysisJob
+from analysis_job import BTC, AnalysisJob
 from configuration import AnalysisConfig
+from correlation import pearson_btc_row
 from events import (
     AnalysisConfigurationProvided,
     AnalysisJobCompleted,
-    CalculateRSIRequested,
     CoinProcessingFailed,
     CorrelationAnalyzed,
     DisplayCompleted,
     FetchPrecisionDataRequested,
-    HistoricalPricesFetched,
     PrecisionDataFetched,
     RSICalculated,
     RunAnalysisRequested,
     TopCoinsFetched,
+    TopCoinsSelected,
 )
 from logger import logger
 
@@ -33,6 +34,22 @@ from logger import logger
 class CryptoAnalyzer(OrchestratorBase):
     """Orchestrates RSI correlation analyses for multiple timeframes."""
 
+    # Columns (and dtypes) of the correlation results, stored column-wise until the final DataFrame is built.
+    RESULT_COLUMNS = {
+        "coin_id": object,
+        "coin_symbol": object,
+        "correlation": np.float64,
+        "market_cap": np.float64,
+        "low_cap_quartile": np.bool_,
+        "timeframe": object,
+    }
+
+    # Bit flags of the initial-data state machine, combined in self._init_state.
+    PRECISION_READY = 1 << 0
+    TOP_COINS_READY = 1 << 1
+    ANALYSIS_STARTED = 1 << 2
+    INITIAL_DATA_READY = PRECISION_READY | TOP_COINS_READY
+
     def __init__(self, config: AnalysisConfig, session_guid: str):
         self.config = config
         self.session_guid = session_guid
@@ -48,22 +65,33 @@ class CryptoAnalyzer(OrchestratorBase):
 
         # Initialize to None for a clear initial state.
         self.coins: Optional[List[Dict]] = None
-        self.precision_data: Optional[Dict[str, Dict]] = None
+        self.precision_data: Optional[Dict[str, List]] = None
 
         self.market_caps: Dict[str, float] = {}
         self.low_cap_threshold: float = float("inf")
-        self.results: List[Dict] = []
+        # Preallocated for at most one result per coin and timeframe; _result_count is the fill level.
+        capacity = self.config.top_n_coins * len(self.config.timeframes)
+        self.results: Dict[str, np.ndarray] = {column: np.empty(capacity, dtype=dtype) for column, dtype in self.RESULT_COLUMNS.items()}
+        self._result_count = 0
+        self._results_lock = threading.Lock()
         self.rsi_results: Dict[Tuple[str, str, str], pd.Series] = {}
         self.analysis_jobs: Dict[str, AnalysisJob] = {tf: AnalysisJob(tf, self) for tf in self.config.timeframes}
 
         self._job_completion_counter = len(self.config.timeframes)
         self._job_lock = threading.Lock()
-        self._initial_data_loaded = threading.Event()
+        self._init_state = 0
+        self._init_lock = threading.Lock()
 
     def register_services(self) -> None:
         """Creates and registers services managed by the orchestrator."""
         self.db_manager = DatabaseManager(service_bus=self.service_bus)
-        self.data_fetcher = DataFetcher(service_bus=self.service_bus)
+        # Never more fetch threads than price requests in the session.
+        price_requests = (self.config.top_n_coins + 1) * len(self.config.timeframes)
+        self.data_fetcher = DataFetcher(
+            service_bus=self.service_bus,
+            concurrency=min(self.config.fetch_concurrency, price_requests),
+            cache_dir=self.config.ohlcv_cache_dir,
+        )
         self.rsi_calculator = RSICalculator(service_bus=self.service_bus)
         self.display_agent = DisplayAgent(service_bus=self.service_bus)
 
@@ -74,7 +102,6 @@ class CryptoAnalyzer(OrchestratorBase):
         self.service_bus.subscribe("RunAnalysisRequested", self._handle_run_analysis_requested)
         self.service_bus.subscribe("TopCoinsFetched", self._handle_top_coins_fetched)
         self.service_bus.subscribe("PrecisionDataFetched", self._handle_precision_data_fetched)
-        self.service_bus.subscribe("HistoricalPricesFetched", self._handle_historical_prices_fetched)
         self.service_bus.subscribe("RSICalculated", self._handle_rsi_calculated)
         self.service_bus.subscribe("CorrelationAnalyzed", self._handle_correlation_analyzed)
         self.service_bus.subscribe("CoinProcessingFailed", self._handle_coin_processing_failed)
@@ -108,8 +135,8 @@ class CryptoAnalyzer(OrchestratorBase):
     def _handle_precision_data_fetched(self, event: PrecisionDataFetched):
 
         try:
-            self.precision_data = {item["symbol"]: item for item in event.precision_data}
-            self._start_analysis_if_ready()
+            self.precision_data = event.precision_data
+            self._start_analysis_if_ready(self.PRECISION_READY)
         except Exception as e:
             error_msg = f"Error handling precision data fetched: {e}"
             logger.critical(error_msg, exc_info=True)
@@ -119,62 +146,69 @@ class CryptoAnalyzer(OrchestratorBase):
 
         try:
             self.coins = event.coins
-            self._start_analysis_if_ready()
+            self._start_analysis_if_ready(self.TOP_COINS_READY)
         except Exception as e:
             error_msg = f"Error handling top coins fetched: {e}"
             logger.critical(error_msg, exc_info=True)
             self.service_bus.publish("AllProcessingCompleted", AllProcessingCompleted(), self.__class__.__name__)
 
-    def _start_analysis_if_ready(self):
+    def _start_analysis_if_ready(self, ready_flag: int = 0):
         """
-        Checks if both initial data streams have been RECEIVED (even if empty),
+        Records ready_flag, checks if both initial data streams have been RECEIVED (even if empty),
         then starts the analysis or stops cleanly.
         """
 
         try:
-            # Check that variables are no longer None.
-            # Using early return pattern to avoid race conditions
-            if self._initial_data_loaded.is_set():
-                return
+            # Single lock-protected bitmask: exactly one caller moves the state to ANALYSIS_STARTED.
+            with self._init_lock:
+                state = self._init_state | ready_flag
 
-            if self.coins is None or self.precision_data is None:
-                logger.debug("Waiting for all initial data...")
-                return
+                if state & self.ANALYSIS_STARTED:
+                    return
+
+                if (state & self.INITIAL_DATA_READY) != self.INITIAL_DATA_READY:
+                    self._init_state = state
+                    logger.debug("Waiting for all initial data...")
+                    return
+
+                self._init_state = state | self.ANALYSIS_STARTED
 
             # Handle the case where received data is empty.
-            if not self.coins or not self.precision_data:
+            if not self.coins or not self.precision_data or not self.precision_data.get("symbol"):
                 logger.warning("No crypto or market pair found. Analysis cannot continue.")
                 self._processing_completed.set()
                 return
 
-            self._initial_data_loaded.set()
             logger.info("Initial data (coins and precision) received. Starting processing.")
 
-            usdc_base_symbols = {m["base_asset"] for m in self.precision_data.values() if m["quote_asset"] == "USDC"}
+            usdc_base_symbols = {
+                base for base, quote in zip(self.precision_data["base_asset"], self.precision_data["quote_asset"]) if quote == "USDC"
+            }
             original_coin_count = len(self.coins)
             self.coins = [c for c in self.coins if c.get("symbol", "").upper() in usdc_base_symbols]
             logger.info(f"Filtering cryptos: {original_coin_count} -> {len(self.coins)} with USDC pair.")
 
-            for coin in self.coins:
-                self.service_bus.publish("SingleCoinFetched", {"coin": coin}, self.__class__.__name__)
+            # One bulk event for all retained coins instead of one event per coin.
+            self.service_bus.publish("TopCoinsSelected", TopCoinsSelected(coins=self.coins), self.__class__.__name__)
 
             self.market_caps = {c["symbol"].lower(): c.get("market_cap", 0) for c in self.coins}
-            market_cap_values = [mc for mc in self.market_caps.values() if mc > 0]
-            if market_cap_values:
-                self.low_cap_threshold = pd.Series(market_cap_values).quantile(self.config.low_cap_percentile / 100)
+            market_cap_values = np.fromiter((mc for mc in self.market_caps.values() if mc and mc > 0), dtype=np.float64)
+            if market_cap_values.size:
+                # np.quantile selects with a partial sort (same linear interpolation as Series.quantile)
+                self.low_cap_threshold = float(np.quantile(market_cap_values, self.config.low_cap_percentile / 100))
 
             logger.info(
                 f"Low capitalization threshold ({self.config.low_cap_percentile}th percentile): ${self.low_cap_threshold:,.2f}"
             )
 
-            coins_to_process = [(c["id"], c["symbol"]) for c in self.coins]
+            coins_to_process = [(c["id"], c["symbol"].lower()) for c in self.coins]
             for timeframe, job in self.analysis_jobs.items():
                 job.set_coins_to_process(coins_to_process)
                 logger.info(f"Launching job for {timeframe} with {len(job.coins_to_process) + 1} pairs.")
 
                 self.service_bus.publish(
                     "FetchHistoricalPricesRequested",
-                    {"coin_id_symbol": ("bitcoin", "btc"), "weeks": self.config.weeks, "timeframe": timeframe},
+                    {"coin_id_symbol": BTC, "weeks": self.config.weeks, "timeframe": timeframe},
                     self.__class__.__name__
                 )
 
@@ -192,85 +226,36 @@ class CryptoAnalyzer(OrchestratorBase):
             # Publier l'événement de fin pour éviter le blocage
             self.service_bus.publish("AllProcessingCompleted", AllProcessingCompleted(), self.__class__.__name__)
 
-    def _handle_historical_prices_fetched(self, event: HistoricalPricesFetched):
-
-        try:
-            prices_df = self._deserialize_prices_dataframe(event.prices_df_json, event.coin_id_symbol)
-
-            if prices_df is None or prices_df.empty:
-                self.service_bus.publish(
-                    "CoinProcessingFailed",
-                    {"coin_id_symbol": event.coin_id_symbol, "timeframe": event.timeframe},
-                    self.__class__.__name__
-                )
-                return
-
-            close_series = prices_df["close"]
-            # noinspection PyUnresolvedReferences
-            series_json = close_series.to_json(orient="split")
-
-            rsi_request_event = CalculateRSIRequested(
-                coin_id_symbol=event.coin_id_symbol, prices_series_json=series_json, timeframe=event.timeframe
-            )
-            sqlite_business_logger.log(self.__class__.__name__, f"CalculateRSIRequested pour {event.coin_id_symbol}")
-            self.service_bus.publish("CalculateRSIRequested", rsi_request_event, self.__class__.__name__)
-        except Exception as e:
-            error_msg = f"Error handling historical prices fetched: {e}"
-            logger.critical(error_msg, exc_info=True)
-            self.service_bus.publish(
-                "CoinProcessingFailed",
-                {"coin_id_symbol": event.coin_id_symbol, "timeframe": event.timeframe},
-                self.__class__.__name__
-            )
-
-    # noinspection PyMethodMayBeStatic
-    def _deserialize_prices_dataframe(self, prices_json: Optional[str], coin_id_symbol: Tuple[str, str]) -> Optional[pd.DataFrame]:
-
-        if not prices_json:
-            return None
-
-        try:
-            prices_df = pd.read_json(StringIO(prices_json), orient="split")
-            prices_df.index = pd.to_datetime(prices_df.index, unit="ms", utc=True)
-            return prices_df
-        except Exception as e:
-            error_msg = f"Impossible de reconstruire le DataFrame des prix pour {coin_id_symbol}: {e}"
-            logger.error(error_msg)
-            return None
-
     def _handle_rsi_calculated(self, event: RSICalculated):
+        coin_id_symbol = event.coin_id_symbol
+        timeframe = event.timeframe
 
         try:
-            logger.debug(f"[CORRELATION-DEBUG] Received RSI for {event.coin_id_symbol} on {event.timeframe}")
-            job = self.analysis_jobs.get(event.timeframe)
+            logger.debug(f"[CORRELATION-DEBUG] Received RSI for {coin_id_symbol} on {timeframe}")
+            job = self.analysis_jobs.get(timeframe)
 
             if not job:
-                logger.warning(f"[CORRELATION-DEBUG] No job found for timeframe {event.timeframe}")
+                logger.warning(f"[CORRELATION-DEBUG] No job found for timeframe {timeframe}")
                 return
 
-            rsi_series = self._deserialize_rsi_series(event.rsi_series_json, event.coin_id_symbol)
+            rsi_series = self._deserialize_rsi_series(event.rsi_series_json, coin_id_symbol)
 
             if rsi_series is None or rsi_series.empty:
-                logger.debug(f"[CORRELATION-DEBUG] RSI series is None or empty for {event.coin_id_symbol}")
+                logger.debug(f"[CORRELATION-DEBUG] RSI series is None or empty for {coin_id_symbol}")
 
                 if self.service_bus is not None:
                     self.service_bus.publish(
                         "CoinProcessingFailed",
-                        {"coin_id_symbol": event.coin_id_symbol, "timeframe": event.timeframe},
+                        {"coin_id_symbol": coin_id_symbol, "timeframe": timeframe},
                         self.__class__.__name__
                     )
                 return
 
-            key = (event.coin_id_symbol[0], event.coin_id_symbol[1], event.timeframe)
-            self.rsi_results[key] = rsi_series
-            logger.debug(f"[CORRELATION-DEBUG] Stored RSI for {event.coin_id_symbol}")
-
-            if event.coin_id_symbol[1].lower() == "btc":
-                job.btc_rsi = rsi_series
-                logger.debug(f"[CORRELATION-DEBUG] Set BTC RSI for {event.timeframe}")
+            self.rsi_results[(coin_id_symbol[0], coin_id_symbol[1], timeframe)] = rsi_series
+            logger.debug(f"[CORRELATION-DEBUG] Stored RSI for {coin_id_symbol}")
 
-            logger.debug(f"[CORRELATION-DEBUG] About to decrement counter for {event.timeframe}")
-            job.decrement_counter(coin_id_symbol=event.coin_id_symbol)
+            logger.debug(f"[CORRELATION-DEBUG] About to decrement counter for {timeframe}")
+            job.decrement_counter(coin_id_symbol=coin_id_symbol)
         except Exception as e:
             error_msg = f"Error handling RSI calculated: {e}"
             logger.critical(error_msg, exc_info=True)
@@ -278,7 +263,7 @@ class CryptoAnalyzer(OrchestratorBase):
             if self.service_bus is not None:
                 self.service_bus.publish(
                     "CoinProcessingFailed",
-                    {"coin_id_symbol": event.coin_id_symbol, "timeframe": event.timeframe},
+                    {"coin_id_symbol": coin_id_symbol, "timeframe": timeframe},
                     self.__class__.__name__
                 )
 
@@ -307,41 +292,66 @@ class CryptoAnalyzer(OrchestratorBase):
             error_msg = f"Error handling coin processing failed: {e}"
             logger.critical(error_msg, exc_info=True)
 
-    def analyze_correlation(
-            self, coin_id_symbol: Tuple[str, str], coin_rsi: pd.Series, btc_rsi: pd.Series, timeframe: str
-    ):
-        common_index_rsi = btc_rsi.index.intersection(coin_rsi.index)
-
-        if len(common_index_rsi) < self.config.rsi_period:
-            logger.debug(f"[CORRELATION-DEBUG] Skipping {coin_id_symbol}: insufficient data ({len(common_index_rsi)} < {self.config.rsi_period})")
-            return
-
-        correlation = coin_rsi.loc[common_index_rsi].corr(btc_rsi.loc[common_index_rsi])
-
-        if pd.isna(correlation) or abs(correlation) < self.config.correlation_threshold:
-            logger.debug(f"[CORRELATION-DEBUG] Skipping {coin_id_symbol}: correlation {correlation} below threshold {self.config.correlation_threshold}")
-            return
-
-        logger.info(f"[CORRELATION-DEBUG] Found valid correlation for {coin_id_symbol}: {correlation}")
-        market_cap = self.market_caps.get(coin_id_symbol[1].lower(), 0)
-        low_cap_quartile = market_cap <= self.low_cap_threshold
+    def analyze_correlations(self, coins: List[Tuple[str, str]], rsi_matrix: np.ndarray, timeframe: str, market_caps: np.ndarray):
+        """
+        Correlates every coin RSI column with the BTC one and publishes the results above the threshold.
 
-        result = {
-            "coin_id": coin_id_symbol[0],
-            "coin_symbol": coin_id_symbol[1],
-            "correlation": float(correlation),  # Conversion de np.float64 -> float
-            "market_cap": market_cap,
-            "low_cap_quartile": bool(low_cap_quartile),  # Conversion de np.bool_ -> bool
-            "timeframe": timeframe,
-        }
-        sqlite_business_logger.log(self.__class__.__name__, f"CorrelationAnalyzed avec {result}")
-        self.service_bus.publish("CorrelationAnalyzed", {"result": result, "timeframe": timeframe}, self.__class__.__name__)
+        Args:
+            coins: (ID, Symbol) of the coins, in the column order of rsi_matrix.
+            rsi_matrix: RSI values aligned on the BTC timestamps, one column per coin followed by the BTC column.
+            timeframe: The timeframe of the analysis.
+            market_caps: Market cap of each coin, in the same order as coins.
+        """
+        # Resolve attributes once into locals.
+        config = self.config
+        min_samples = config.rsi_period
+        threshold = config.correlation_threshold
+
+        btc_col = len(coins)
+        valid = ~np.isnan(rsi_matrix)
+        sample_counts = (valid & valid[:, btc_col:btc_col + 1]).sum(axis=0)
+        correlations = pearson_btc_row(rsi_matrix, btc_col)
+
+        # Single mask instead of one branch per coin; NaN correlations compare False.
+        abs_corrs = np.abs(correlations)
+        selected = (sample_counts[:btc_col] >= min_samples) & (abs_corrs[:btc_col] >= threshold)
+        logger.debug(f"[CORRELATION-DEBUG] {int(selected.sum())}/{btc_col} coins above threshold {threshold} on {timeframe}")
+
+        # Post-filter on the survivors only: the low-cap flag is one array comparison.
+        # The low-cap quartile is reported as a flag, it does not filter results.
+        survivors = np.flatnonzero(selected)
+        survivor_caps = market_caps[survivors]
+        low_cap_flags = survivor_caps <= self.low_cap_threshold
+
+        for idx, market_cap, low_cap_quartile in zip(survivors.tolist(), survivor_caps.tolist(), low_cap_flags.tolist()):
+            coin_id, coin_symbol = coins[idx]
+            correlation = float(correlations[idx])  # Conversion de np.float64 -> float
+            logger.info(f"[CORRELATION-DEBUG] Found valid correlation for {coins[idx]}: {correlation}")
+
+            result = {
+                "coin_id": coin_id,
+                "coin_symbol": coin_symbol,
+                "correlation": correlation,
+                "market_cap": market_cap,
+                "low_cap_quartile": low_cap_quartile,
+                "timeframe": timeframe,
+            }
+            sqlite_business_logger.log(self.__class__.__name__, f"CorrelationAnalyzed avec {result}")
+            self.service_bus.publish("CorrelationAnalyzed", {"result": result, "timeframe": timeframe}, self.__class__.__name__)
 
     def _handle_correlation_analyzed(self, event: CorrelationAnalyzed):
 
         try:
-            if event.result:
-                self.results.append(event.result)
+            result = event.result
+            if result:
+                with self._results_lock:
+                    position = self._result_count
+                    if position == len(self.results["correlation"]):
+                        self.results = {column: np.resize(values, max(2 * position, 1)) for column, values in self.results.items()}
+
+                    for column, values in self.results.items():
+                        values[position] = result.get(column)
+                    self._result_count = position + 1
         except Exception as e:
             error_msg = f"Error handling correlation analyzed: {e}"
             logger.critical(error_msg, exc_info=True)
@@ -354,9 +364,13 @@ class CryptoAnalyzer(OrchestratorBase):
                 logger.info(f"Job for {event.timeframe} completed. Remaining: {self._job_completion_counter}")
                 if self._job_completion_counter <= 0:
                     logger.info("All analysis jobs completed. Preparing final results.")
+                    # Single DataFrame construction from the columns, then records for the event payload.
+                    with self._results_lock:
+                        count = self._result_count
+                        results = pd.DataFrame({column: values[:count] for column, values in self.results.items()}).to_dict(orient="records")
                     self.service_bus.publish(
                         "FinalResultsReady",
-                        {"results": self.results, "weeks": self.config.weeks, "timeframes": self.config.timeframes},
+                        {"results": results, "weeks": self.config.weeks, "timeframes": self.config.timeframes},
                         self.__class__.__name__
                     )
         except Exception as e:
@@ -34,9 +34,9 @@ class TopCoinsFetched(FrozenBaseModel):
     coins: List[Dict] = Field(description="Liste des données brutes des cryptos récupérées.")
 
 
-class SingleCoinFetched(FrozenBaseModel):
-    """Event published for each individual coin fetched."""
-    coin: Dict = Field(description="Données brutes pour une seule crypto.")
+class TopCoinsSelected(FrozenBaseModel):
+    """Event published once with all the coins retained for analysis."""
+    coins: List[Dict] = Field(description="Liste des données brutes des cryptos retenues pour l'analyse.")
 
 
 class FetchHistoricalPricesRequested(FrozenBaseModel):
@@ -54,13 +54,6 @@ class HistoricalPricesFetched(FrozenBaseModel):
     timeframe: str = Field(description="L'unité de temps des données.")
 
 
-class CalculateRSIRequested(FrozenBaseModel):
-    """Request to calculate the RSI for a series of prices."""
-    coin_id_symbol: Tuple[str, str] = Field(description="Tuple (ID, Symbole) de la crypto à traiter.")
-    prices_series_json: Optional[str] = Field(default=None, description="La série des prix de clôture sérialisée en JSON.")
-    timeframe: str = Field(description="L'unité de temps concernée.")
-
-
 class RSICalculated(FrozenBaseModel):
     """Event indicating that the RSI for a coin has been calculated."""
     coin_id_symbol: Tuple[str, str] = Field(description="Tuple (ID, Symbole) de la crypto traitée.")
@@ -105,4 +98,6 @@ class FetchPrecisionDataRequested(FrozenBaseModel):
 
 class PrecisionDataFetched(FrozenBaseModel):
     """Event containing the fetched market precision data."""
-    precision_data: List[Dict] = Field(description="Liste des données de précision des marchés de l'exchange.")
+    precision_data: Dict[str, List] = Field(
+        description="Données de précision des marchés de l'exchange, en colonnes : nom du champ -> liste des valeurs, une par marché."
+    )
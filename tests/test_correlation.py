@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from correlation import pearson_btc_row
+
+
+def test_pearson_btc_row_matches_pandas_corr():
+    """Vérifie que le noyau vectorisé donne la même corrélation que pandas, colonne par colonne."""
+    rng = np.random.default_rng(42)
+    btc = rng.uniform(20, 80, size=200)
+    matrix = np.column_stack((btc + rng.normal(0, 5, 200), rng.uniform(20, 80, 200), -btc, btc))
+
+    correlations = pearson_btc_row(matrix, btc_col=3)
+
+    expected = [pd.Series(matrix[:, j]).corr(pd.Series(btc)) for j in range(matrix.shape[1])]
+    np.testing.assert_allclose(correlations, expected)
+    assert np.isclose(correlations[3], 1.0)
+
+
+def test_pearson_btc_row_constant_column_is_nan():
+    """Une colonne constante n'a pas de variance : la corrélation doit être NaN, comme avec pandas."""
+    btc = np.linspace(10, 90, 50)
+    matrix = np.column_stack((np.full(50, 50.0), btc))
+
+    correlations = pearson_btc_row(matrix, btc_col=1)
+
+    assert np.isnan(correlations[0])
+    assert np.isclose(correlations[1], 1.0)
+
+
+def test_pearson_btc_row_ignores_missing_values_pairwise():
+    """Les NaN (historique plus court, trous) sont exclus paire par paire, comme Series.corr."""
+    rng = np.random.default_rng(7)
+    btc = rng.uniform(20, 80, size=120)
+    coin = btc * 0.5 + rng.normal(0, 3, 120)
+    coin[:40] = np.nan
+    btc_with_gap = btc.copy()
+    btc_with_gap[100:105] = np.nan
+    matrix = np.column_stack((coin, btc_with_gap))
+
+    correlations = pearson_btc_row(matrix, btc_col=1)
+
+    assert np.isclose(correlations[0], pd.Series(coin).corr(pd.Series(btc_with_gap)))
+    assert np.isclose(correlations[1], 1.0)
@@ -1,6 +1,10 @@
 from unittest.mock import patch, ANY
 
+import numpy as np
+import pandas as pd
+
 from crypto_analyzer import CryptoAnalyzer
+from events import AnalysisJobCompleted, CorrelationAnalyzed, PrecisionDataFetched, TopCoinsFetched
 
 
 # On utilise les fixtures définies dans conftest.py
@@ -28,14 +32,111 @@ def test_start_analysis_if_ready_starts_processing(analysis_config, mocker):
         # On mock le service_bus de l'instance pour vérifier les appels
         analyzer.service_bus = mocker.MagicMock()
 
-        # On simule la réception des données initiales
-        analyzer.coins = [{"id": "bitcoin", "symbol": "BTC", "market_cap": 1000}]
-        analyzer.precision_data = {"BTC/USDC": {"base_asset": "BTC", "quote_asset": "USDC"}}
-
-        # On appelle la méthode à tester
-        analyzer._start_analysis_if_ready()
+        # On simule la réception des données initiales : la seconde réception déclenche l'analyse
+        analyzer._handle_top_coins_fetched(TopCoinsFetched(coins=[{"id": "bitcoin", "symbol": "BTC", "market_cap": 1000}]))
+        analyzer._handle_precision_data_fetched(
+            PrecisionDataFetched(precision_data={"symbol": ["BTC/USDC"], "base_asset": ["BTC"], "quote_asset": ["USDC"]})
+        )
 
         # On vérifie que la méthode a bien publié les événements pour lancer le fetching
         # noinspection PyUnresolvedReferences
         analyzer.service_bus.publish.assert_any_call("FetchHistoricalPricesRequested", ANY, "CryptoAnalyzer")
-        assert analyzer._initial_data_loaded.is_set()
+        assert analyzer._init_state & CryptoAnalyzer.ANALYSIS_STARTED
+
+
+def test_correlation_analysis_selects_coins_aligned_on_btc(analysis_config, mocker):
+    """
+    Teste la sélection de bout en bout : alignement sur les horodatages BTC, nombre minimal d'échantillons,
+    seuil de corrélation et drapeau de faible capitalisation.
+    """
+    rng = np.random.default_rng(3)
+    index = pd.date_range("2024-01-01", periods=60, freq="h", tz="UTC")
+    btc = pd.Series(rng.uniform(20, 80, 60), index=index)
+    # Suit BTC sur toute la fenêtre
+    eth = btc + rng.normal(0, 2, 60)
+    # Suit BTC avec des trous, et un horodatage absent de l'index BTC
+    gap = (btc * 0.8 + rng.normal(0, 2, 60)).drop(index[10:20])
+    gap[index[-1] + pd.Timedelta(hours=1)] = 50.0
+    # Suit BTC, mais sur moins de rsi_period bougies communes
+    short = btc.iloc[-10:] + rng.normal(0, 1, 10)
+    # Sans rapport avec BTC
+    noise = pd.Series(rng.uniform(20, 80, 60), index=index)
+
+    coins = [
+        {"id": "bitcoin", "symbol": "BTC", "market_cap": 1000},
+        {"id": "ethereum", "symbol": "ETH", "market_cap": 500},
+        {"id": "gapcoin", "symbol": "GAP", "market_cap": 10},
+        {"id": "shortcoin", "symbol": "SHORT", "market_cap": 400},
+        {"id": "noisecoin", "symbol": "NOISE", "market_cap": 300},
+        {"id": "missingcoin", "symbol": "MISSING", "market_cap": 200},
+    ]
+    symbols = [c["symbol"] for c in coins]
+
+    with patch('crypto_analyzer.ServiceBus'):
+        analyzer = CryptoAnalyzer(config=analysis_config, session_guid="test-guid")
+        analyzer.service_bus = mocker.MagicMock()
+
+        analyzer._handle_top_coins_fetched(TopCoinsFetched(coins=coins))
+        analyzer._handle_precision_data_fetched(
+            PrecisionDataFetched(
+                precision_data={"symbol": [f"{s}/USDC" for s in symbols], "base_asset": symbols, "quote_asset": ["USDC"] * len(symbols)}
+            )
+        )
+
+        timeframe = analysis_config.timeframes[0]
+        # MISSING n'a pas de RSI : il est ignoré
+
+        for coin_id, symbol, rsi in (("bitcoin", "btc", btc), ("ethereum", "eth", eth), ("gapcoin", "gap", gap),
+                                     ("shortcoin", "short", short), ("noisecoin", "noise", noise)):
+            analyzer.rsi_results[(coin_id, symbol, timeframe)] = rsi
+        analyzer.service_bus.publish.reset_mock()
+
+        analyzer.analysis_jobs[timeframe].start_correlation_analysis()
+
+    # noinspection PyUnresolvedReferences
+    published = [c.args[1]["result"] for c in analyzer.service_bus.publish.call_args_list if c.args[0] == "CorrelationAnalyzed"]
+    results = {r["coin_symbol"]: r for r in published}
+
+    assert list(results) == ["eth", "gap"]
+    # La corrélation de GAP porte sur les seuls horodatages communs avec BTC, comme Series.corr
+    assert np.isclose(results["gap"]["correlation"], gap.corr(btc))
+    assert np.isclose(results["eth"]["correlation"], eth.corr(btc))
+    # Le seuil est le 25e percentile des capitalisations : seule GAP est en dessous
+    assert results["gap"]["low_cap_quartile"] is True
+    assert results["eth"]["low_cap_quartile"] is False
+    assert results["gap"]["market_cap"] == 10
+
+
+def test_results_buffer_grows_and_keeps_records_in_order(analysis_config, mocker):
+    """
+    Teste que le tampon de résultats, plein au-delà de sa capacité initiale, s'agrandit sans perdre
+    ni réordonner les enregistrements publiés dans FinalResultsReady.
+    """
+    with patch('crypto_analyzer.ServiceBus'):
+        analyzer = CryptoAnalyzer(config=analysis_config, session_guid="test-guid")
+        analyzer.service_bus = mocker.MagicMock()
+
+    timeframe = analysis_config.timeframes[0]
+    capacity = len(analyzer.results["correlation"])
+    expected = [
+        {
+            "coin_id": f"coin-{i}",
+            "coin_symbol": f"c{i}",
+            "correlation": 0.5 + i / 1000,
+            "market_cap": float(1000 * i),
+            "low_cap_quartile": i % 2 == 0,
+            "timeframe": timeframe,
+        }
+
+        for i in range(2 * capacity + 3)
+    ]
+
+    for result in expected:
+        analyzer._handle_correlation_analyzed(CorrelationAnalyzed(result=result, timeframe=timeframe))
+    analyzer._handle_analysis_job_completed(AnalysisJobCompleted(timeframe=timeframe))
+
+    assert len(analyzer.results["correlation"]) > capacity
+    # noinspection PyUnresolvedReferences
+    analyzer.service_bus.publish.assert_called_once_with("FinalResultsReady", ANY, "CryptoAnalyzer")
+    # noinspection PyUnresolvedReferences
+    assert analyzer.service_bus.publish.call_args.args[1]["results"] == expected
@@ -1,3 +1,7 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
 from unittest.mock import ANY
 
 # noinspection PyPackageRequirements
@@ -5,7 +9,7 @@ import pytest
 
 from agents.data_fetcher import DataFetcher
 # On importe tous les événements nécessaires pour le test
-from events import FetchTopCoinsRequested, AnalysisConfigurationProvided, TopCoinsFetched
+from events import FetchTopCoinsRequested, FetchHistoricalPricesRequested, AnalysisConfigurationProvided, TopCoinsFetched
 
 
 # Une fixture pour créer une instance de DataFetcher pour chaque test
@@ -27,17 +31,34 @@ def test_handle_configuration_provided(data_fetcher, analysis_config):  # On inj
     assert data_fetcher.session_guid == "test-guid-123"
 
 
-def test_handle_fetch_top_coins_requested_adds_task(data_fetcher, mocker):
-    """Teste que la réception de l'événement de requête ajoute la bonne tâche."""
-    # On espionne la méthode add_task pour voir si elle est appelée correctement
-    mocker.patch.object(data_fetcher, 'add_task')
+def test_handle_fetch_top_coins_requested_submits_to_pool(data_fetcher, mocker):
+    """Teste que la réception de l'événement de requête soumet la bonne tâche au pool CoinGecko."""
+    # On espionne les deux pools pour voir si la tâche est soumise au bon
+    mocker.patch.object(data_fetcher, '_coingecko_executor')
+    mocker.patch.object(data_fetcher, '_executor')
 
     event = FetchTopCoinsRequested(n=50)
     data_fetcher._handle_fetch_top_coins_requested(event)
 
-    # On vérifie que la bonne tâche a été mise en file d'attente avec le bon argument
+    # On vérifie que la bonne tâche a été soumise avec le bon argument, sans occuper le pool Binance
+    # noinspection PyUnresolvedReferences
+    data_fetcher._coingecko_executor.submit.assert_called_once_with(data_fetcher._fetch_top_coins_task, 50)
+    # noinspection PyUnresolvedReferences
+    data_fetcher._executor.submit.assert_not_called()
+
+
+def test_handle_fetch_historical_prices_requested_submits_to_pool(data_fetcher, mocker):
+    """Teste que les requêtes de prix historiques partent sur le pool de threads et non sur la file unique."""
+    mocker.patch.object(data_fetcher, '_executor')
+    mocker.patch.object(data_fetcher, 'add_task')
+
+    event = FetchHistoricalPricesRequested(coin_id_symbol=("ethereum", "eth"), weeks=4, timeframe="1d")
+    data_fetcher._handle_fetch_historical_prices_requested(event)
+
+    # noinspection PyUnresolvedReferences
+    data_fetcher._executor.submit.assert_called_once_with(data_fetcher._fetch_historical_prices_task, ("ethereum", "eth"), 4, "1d")
     # noinspection PyUnresolvedReferences
-    data_fetcher.add_task.assert_called_once_with("_fetch_top_coins_task", 50)
+    data_fetcher.add_task.assert_not_called()
 
 
 def test_fetch_top_coins_task_publishes_result(data_fetcher, mocker):
@@ -56,3 +77,218 @@ def test_fetch_top_coins_task_publishes_result(data_fetcher, mocker):
     expected_event = TopCoinsFetched(coins=mock_coins)
     # noinspection PyUnresolvedReferences
     data_fetcher.service_bus.publish.assert_called_once_with("TopCoinsFetched", expected_event, "DataFetcher")
+
+
+def test_fetch_historical_prices_task_fetches_each_request_from_binance(data_fetcher, mocker):
+    """Teste que chaque requête de prix repart de Binance : aucune réponse précédente n'est servie depuis la mémoire."""
+    ohlcv = [[1700000000000, 1.0, 2.0, 0.5, 1.5, 10.0]]
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.fetch_ohlcv.return_value = ohlcv
+    mocker.patch.object(data_fetcher, "_load_markets", return_value=({"ETH/USDC": {}}, {}))
+
+    data_fetcher._fetch_historical_prices_task(("ethereum", "eth"), 4, "1d")
+    data_fetcher._fetch_historical_prices_task(("ethereum", "eth"), 4, "1d")
+
+    # noinspection PyUnresolvedReferences
+    assert data_fetcher.binance.fetch_ohlcv.call_count == 2
+    # noinspection PyUnresolvedReferences
+    assert data_fetcher.service_bus.publish.call_args.args[0] == "HistoricalPricesFetched"
+
+
+def test_shared_throttle_paces_concurrent_requests(data_fetcher):
+    """Teste que des threads qui partagent le client Binance attendent chacun leur tour au lieu de partir ensemble."""
+
+    # Même logique que le throttle synchrone de CCXT : lecture du dernier horodatage, sans verrou
+    class RacyExchange:
+        rateLimit = 50
+        lastRestRequestTimestamp = 0.0
+
+        @staticmethod
+        def milliseconds():
+            return time.monotonic() * 1000
+
+        def throttle(self, cost=None):
+            elapsed = self.milliseconds() - self.lastRestRequestTimestamp
+            time.sleep(max(0.0, self.rateLimit * (cost or 1) - elapsed) / 1000)
+
+    data_fetcher.binance = RacyExchange()
+    data_fetcher._install_shared_throttle()
+    starts = []
+
+    def request():
+        data_fetcher.binance.throttle(1)
+        starts.append(time.monotonic())
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    starts.sort()
+    # Chaque requête démarre au moins un intervalle après la précédente (petite marge pour l'horloge)
+    assert all(b - a >= 0.045 for a, b in zip(starts, starts[1:]))
+
+
+def test_binance_retry_log_names_the_retried_call(mocker):
+    """Teste que le message de nouvelle tentative indique le symbole et le timeframe concernés."""
+    mock_logger = mocker.patch("agents.data_fetcher.logger")
+
+    def fetch_ohlcv(symbol, timeframe, since=None, limit=None):
+        return [symbol, timeframe, since, limit]
+
+    retry_state = SimpleNamespace(
+        fn=fetch_ohlcv, args=("ETH/USDC", "1h"), kwargs={"since": 0, "limit": 1000},
+        next_action=SimpleNamespace(sleep=5.0), attempt_number=1,
+    )
+    DataFetcher._log_binance_retry(retry_state)
+
+    message = mock_logger.warning.call_args.args[0]
+    assert "fetch_ohlcv('ETH/USDC', '1h', since=0, limit=1000)" in message
+
+
+def test_fetch_precision_data_task_reads_filters_by_type(data_fetcher, mocker):
+    """Teste que les filtres LOT_SIZE, PRICE_FILTER et NOTIONAL sont bien extraits, et les marchés incomplets ou non spot ignorés."""
+    filters = [
+        {"filterType": "PRICE_FILTER", "tickSize": "0.01"},
+        {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"},
+        {"filterType": "NOTIONAL", "minNotional": "5"},
+    ]
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.load_markets.return_value = {
+        "ETH/USDC": {"symbol": "ETH/USDC", "base": "ETH", "quote": "USDC", "active": True, "spot": True,
+                     "info": {"baseAssetPrecision": 8, "filters": filters}},
+        "XYZ/USDC": {"symbol": "XYZ/USDC", "base": "XYZ", "quote": "USDC", "active": True, "spot": True,
+                     "info": {"filters": filters[:1]}},
+        "ETH/USDC:USDC": {"symbol": "ETH/USDC:USDC", "base": "ETH", "quote": "USDC", "active": True, "spot": False,
+                          "info": {"filters": filters}},
+    }
+
+    data_fetcher._fetch_precision_data_task()
+
+    # noinspection PyUnresolvedReferences
+    payload = data_fetcher.service_bus.publish.call_args.args[1]
+    assert payload.precision_data == {
+        "symbol": ["ETH/USDC"], "quote_asset": ["USDC"], "base_asset": ["ETH"], "status": [True], "base_asset_precision": [8],
+        "step_size": ["0.001"], "min_qty": ["0.001"], "tick_size": ["0.01"], "min_notional": ["5"],
+    }
+
+
+def test_load_markets_reuses_markets_within_ttl(data_fetcher, mocker):
+    """Teste que les marchés Binance ne sont chargés qu'une fois tant que le TTL n'est pas expiré."""
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.load_markets.return_value = {"ETH/USDC": {}}
+
+    data_fetcher._load_markets()
+    data_fetcher._load_markets()
+
+    # noinspection PyUnresolvedReferences
+    data_fetcher.binance.load_markets.assert_called_once_with(reload=True)
+
+
+def test_fetch_ohlcv_incremental_requests_only_new_candles(data_fetcher, mocker, tmp_path):
+    """Teste que le cache disque ne redemande que les bougies postérieures à la dernière bougie en cache."""
+    day = 86_400_000
+    candles = [[t * day, 1.0, 2.0, 0.5, float(t), 10.0] for t in range(10)]
+    data_fetcher.cache_dir = tmp_path
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.fetch_ohlcv.side_effect = lambda symbol, timeframe, since, limit: [c for c in candles if c[0] >= since][:limit]
+
+    data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", 2 * day)
+    # Une nouvelle bougie apparaît entre les deux exécutions, une journée plus tard
+    candles.append([10 * day, 1.0, 2.0, 0.5, 10.0, 10.0])
+    os.utime(tmp_path / "ETH_USDC_1d.npy", (time.time() - 86_400, time.time() - 86_400))
+    result = data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", 3 * day)
+
+    assert result == [c for c in candles if c[0] >= 3 * day]
+    # Le second appel repart de la dernière bougie en cache, pas du début de la fenêtre
+    # noinspection PyUnresolvedReferences
+    assert data_fetcher.binance.fetch_ohlcv.call_args.kwargs["since"] == 9 * day
+
+
+def test_fetch_ohlcv_incremental_keeps_cached_rows_when_delta_is_empty(data_fetcher, mocker, tmp_path):
+    """Teste qu'une mise à jour vide de Binance renvoie les bougies déjà en cache au lieu d'une liste vide."""
+    day = 86_400_000
+    candles = [[t * day, 1.0, 2.0, 0.5, float(t), 10.0] for t in range(10)]
+    data_fetcher.cache_dir = tmp_path
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.fetch_ohlcv.return_value = candles
+
+    data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", 2 * day)
+    # Binance ne renvoie plus rien pour la mise à jour
+    data_fetcher.binance.fetch_ohlcv.return_value = []
+    result = data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", 3 * day)
+
+    assert result == candles[3:]
+
+
+def test_fetch_ohlcv_paginates_until_range_is_covered(data_fetcher, mocker):
+    """Teste que la récupération OHLCV enchaîne les pages quand la fenêtre dépasse la limite d'une requête."""
+    day = 86_400_000
+    candles = [[t * day, 1.0, 2.0, 0.5, float(t), 10.0] for t in range(5)]
+    data_fetcher.OHLCV_FETCH_LIMIT = 2
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.fetch_ohlcv.side_effect = lambda symbol, timeframe, since, limit: [c for c in candles if c[0] >= since][:limit]
+
+    result = data_fetcher._fetch_ohlcv("ETH/USDC", "1d", 0)
+
+    assert result == candles
+    # Pages de 2, 2 puis 1 bougie : la dernière page incomplète arrête la pagination
+    # noinspection PyUnresolvedReferences
+    assert [c.kwargs["since"] for c in data_fetcher.binance.fetch_ohlcv.call_args_list] == [0, 2 * day, 4 * day]
+
+
+def test_fetch_ohlcv_incremental_serves_fresh_cache_without_network(data_fetcher, mocker, tmp_path):
+    """Teste qu'un cache disque récent, dont la dernière bougie est la bougie en cours, est servi sans appeler Binance."""
+    day = 86_400_000
+    today = int(time.time() * 1000) // day * day
+    candles = [[today - (9 - t) * day, 1.0, 2.0, 0.5, float(t), 10.0] for t in range(10)]
+    data_fetcher.cache_dir = tmp_path
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.fetch_ohlcv.side_effect = lambda symbol, timeframe, since, limit: [c for c in candles if c[0] >= since][:limit]
+
+    data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", candles[2][0])
+    data_fetcher.binance.fetch_ohlcv.reset_mock()
+    result = data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", candles[3][0])
+
+    assert result == candles[3:]
+    # noinspection PyUnresolvedReferences
+    data_fetcher.binance.fetch_ohlcv.assert_not_called()
+
+
+def test_fetch_ohlcv_incremental_refetches_when_a_new_candle_has_opened(data_fetcher, mocker, tmp_path):
+    """Teste qu'un cache récent est tout de même complété quand sa dernière bougie n'est plus la bougie en cours."""
+    day = 86_400_000
+    today = int(time.time() * 1000) // day * day
+    candles = [[today - (10 - t) * day, 1.0, 2.0, 0.5, float(t), 10.0] for t in range(10)]
+    data_fetcher.cache_dir = tmp_path
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.fetch_ohlcv.side_effect = lambda symbol, timeframe, since, limit: [c for c in candles if c[0] >= since][:limit]
+
+    # Le cache s'arrête à hier : la bougie du jour s'est ouverte depuis
+    data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", candles[2][0])
+    candles.append([today, 1.0, 2.0, 0.5, 10.0, 10.0])
+    result = data_fetcher._fetch_ohlcv_incremental("ETH/USDC", "1d", candles[3][0])
+
+    assert result == candles[3:]
+    # noinspection PyUnresolvedReferences
+    assert data_fetcher.binance.fetch_ohlcv.call_args.kwargs["since"] == today - day
+
+
+def test_load_markets_returns_markets_and_filters_of_the_same_load(data_fetcher, mocker):
+    """Teste que les marchés et leurs filtres sont renvoyés ensemble, y compris depuis le cache TTL."""
+    data_fetcher.binance = mocker.MagicMock()
+    data_fetcher.binance.load_markets.return_value = {
+        "ETH/USDC": {"active": True, "spot": True, "info": {"filters": [{"filterType": "LOT_SIZE"}]}},
+    }
+
+    first = data_fetcher._load_markets()
+    # Le client ccxt peut être rechargé ailleurs : le cache ne doit pas lire son état courant
+    data_fetcher.binance.markets = {}
+    second = data_fetcher._load_markets()
+
+    assert first == second
+    markets, filters = second
+    assert set(markets) == set(filters) == {"ETH/USDC"}
@@ -3,11 +3,12 @@ import sqlite3
 import tempfile
 from unittest.mock import MagicMock
 
+import pandas as pd
 # noinspection PyPackageRequirements
 import pytest
 
-from agents.database_manager import DatabaseManager
-from events import AnalysisConfigurationProvided, SingleCoinFetched
+from agents.database_manager import DatabaseManager, _iso_timestamps
+from events import AnalysisConfigurationProvided, TopCoinsSelected
 
 
 # On utilise la fixture partagée de conftest.py pour la configuration
@@ -61,19 +62,189 @@ def test_tables_are_created(db_manager):
     assert expected_tables.issubset(tables)
 
 
-def test_handle_single_coin_fetched_adds_task(db_manager, mocker):
+def test_session_indexes_are_created(db_manager):
     """
-    Vérifie que l'événement SingleCoinFetched ajoute bien une tâche à la file d'attente.
+    Vérifie que les index de lecture par session et timeframe sont créés au démarrage, sur les seules corrélations.
     """
-    # On espionne la méthode add_task
-    mocker.patch.object(db_manager, 'add_task')
+    conn = sqlite3.connect(db_manager.db_name)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    conn.close()
 
-    coin_data = {"id": "bitcoin", "symbol": "btc"}
-    event = SingleCoinFetched(coin=coin_data)
+    assert {"idx_correlations_session_tf", "idx_correlations_session_ts"}.issubset(indexes)
+    # Les tables prices et rsi ne sont jamais lues par session : pas d'index secondaire à maintenir
+    assert not {"idx_prices_session_tf_coin", "idx_rsi_session_tf_coin"} & indexes
 
-    # On appelle le handler
-    db_manager._handle_single_coin_fetched(event)
 
-    # On vérifie que la tâche d'enregistrement a bien été ajoutée
+def test_handle_top_coins_selected_adds_single_bulk_task(db_manager, mocker):
+    """
+    Vérifie que l'événement TopCoinsSelected ajoute une seule tâche d'enregistrement groupé.
+    """
+    mocker.patch.object(db_manager, 'add_task')
+
+    coins = [{"id": "bitcoin", "symbol": "btc"}, {"id": "ethereum", "symbol": "eth"}]
+    db_manager._handle_top_coins_selected(TopCoinsSelected(coins=coins))
+
     # noinspection PyUnresolvedReferences
-    db_manager.add_task.assert_called_once_with("_db_save_token", coin_data, "test-guid")
+    db_manager.add_task.assert_called_once_with("_db_save_tokens", coins, "test-guid")
+
+
+def test_db_save_precision_data_inserts_columnar_payload(db_manager):
+    """
+    Vérifie que les données de précision reçues en colonnes sont bien enregistrées ligne par ligne.
+    """
+    precision_data = {
+        "symbol": ["ETH/USDC", "SOL/USDC"], "quote_asset": ["USDC", "USDC"], "base_asset": ["ETH", "SOL"],
+        "status": [True, True], "base_asset_precision": [8, 8], "step_size": ["0.0001", "0.001"],
+        "min_qty": ["0.0001", "0.001"], "tick_size": ["0.01", "0.01"], "min_notional": ["5", "5"],
+    }
+
+    db_manager.add_task("_db_save_precision_data", precision_data, "test-guid")
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    conn = sqlite3.connect(db_manager.db_name)
+    rows = conn.execute("SELECT symbol, base_asset, step_size FROM precision_data ORDER BY symbol").fetchall()
+    conn.close()
+
+    assert rows == [("ETH/USDC", "ETH", 0.0001), ("SOL/USDC", "SOL", 0.001)]
+
+
+def test_queued_tasks_are_drained_and_awaited(db_manager):
+    """
+    Vérifie que les tâches mises en file sont toutes exécutées avant que wait_for_queue_completion ne rende la main.
+    """
+    db_manager.add_task("_db_save_tokens", [{"id": "ethereum", "symbol": "eth"}], "test-guid")
+    db_manager.add_task("_db_save_tokens", [{"id": "solana", "symbol": "sol"}], "test-guid")
+
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    conn = sqlite3.connect(db_manager.db_name)
+    count = conn.execute("SELECT COUNT(*) FROM tokens WHERE session_guid = 'test-guid'").fetchone()[0]
+    conn.close()
+
+    assert count == 2
+
+
+def test_db_save_prices_inserts_all_rows(db_manager):
+    """
+    Vérifie que les bougies OHLCV d'un DataFrame sont insérées avec un horodatage ISO.
+    """
+    index = pd.to_datetime(["2024-01-01", "2024-01-02"]).rename("timestamp")
+    prices_df = pd.DataFrame(
+        {"open": [1.0, 2.0], "high": [1.5, 2.5], "low": [0.5, 1.5], "close": [1.2, 2.2], "volume": [10.0, 20.0]},
+        index=index,
+    )
+
+    db_manager.add_task("_db_save_prices", ("ethereum", "eth"), prices_df, "test-guid", "1d")
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    conn = sqlite3.connect(db_manager.db_name)
+    rows = conn.execute("SELECT timestamp, open, close, volume FROM prices ORDER BY timestamp").fetchall()
+    conn.close()
+
+    assert rows == [("2024-01-01T00:00:00", 1.0, 1.2, 10.0), ("2024-01-02T00:00:00", 2.0, 2.2, 20.0)]
+
+
+def test_db_save_rsi_skips_missing_values(db_manager):
+    """
+    Vérifie que seules les valeurs RSI définies sont insérées.
+    """
+    index = pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"])
+    rsi_series = pd.Series([float("nan"), 55.0, 60.0], index=index)
+
+    db_manager.add_task("_db_save_rsi", ("ethereum", "eth"), rsi_series, "test-guid", "1d")
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    conn = sqlite3.connect(db_manager.db_name)
+    rows = conn.execute("SELECT timestamp, rsi FROM rsi ORDER BY timestamp").fetchall()
+    conn.close()
+
+    assert rows == [("2024-01-02T00:00:00", 55.0), ("2024-01-03T00:00:00", 60.0)]
+
+
+def test_iso_timestamps_matches_timestamp_isoformat():
+    """
+    Vérifie que le formatage vectorisé produit exactement Timestamp.isoformat(), y compris hors chemin rapide.
+    """
+
+    for index in (
+        pd.to_datetime([1704067200000, 1704153600000], unit="ms"),
+        pd.to_datetime([1704067200000], unit="ms").tz_localize("UTC"),
+        pd.to_datetime([1704067200000], unit="ms").tz_localize("Europe/Paris"),
+        pd.to_datetime(["2024-01-01 00:00:00.5"]),
+    ):
+        assert _iso_timestamps(index) == [ts.isoformat() for ts in index]
+
+
+def test_consecutive_correlation_tasks_are_saved(db_manager):
+    """
+    Vérifie que des tâches de corrélation consécutives, regroupées en un seul executemany, sont toutes enregistrées.
+    """
+
+    for coin_id, symbol in (("ethereum", "eth"), ("solana", "sol"), ("cardano", "ada")):
+        db_manager.add_task("_db_save_correlation", (coin_id, symbol), "2024-01-01T00:00:00", 0.5, 1e9, False, "test-guid", "1d")
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    # Le regroupement lui-même, appelé directement avec les arguments de chaque tâche
+    # noinspection PyProtectedMember
+    db_manager._db_save_correlation_calls([(("bitcoin", "btc"), "2024-01-02T00:00:00", 1.0, 1e12, False, "test-guid", "1d")])
+    db_manager.conn.commit()
+
+    conn = sqlite3.connect(db_manager.db_name)
+    coin_ids = {row[0] for row in conn.execute("SELECT coin_id FROM correlations WHERE session_guid = 'test-guid'")}
+    conn.close()
+
+    assert coin_ids == {"ethereum", "solana", "cardano", "bitcoin"}
+
+
+def test_grouped_correlation_calls_keep_good_rows(db_manager):
+    """
+    Vérifie qu'une tâche invalide ou un doublon de clé primaire ne fait perdre que la tâche fautive.
+    """
+    good = (("ethereum", "eth"), "2024-01-01T00:00:00", 0.5, 1e9, False, "test-guid", "1d")
+    other = (("solana", "sol"), "2024-01-01T00:00:00", 0.4, 1e9, False, "test-guid", "1d")
+    malformed = ("cardano",)
+
+    # noinspection PyProtectedMember
+    db_manager._db_save_correlation_calls([good, malformed, other, good])
+    db_manager.conn.commit()
+
+    conn = sqlite3.connect(db_manager.db_name)
+    coin_ids = sorted(row[0] for row in conn.execute("SELECT coin_id FROM correlations WHERE session_guid = 'test-guid'"))
+    conn.close()
+
+    assert coin_ids == ["ethereum", "solana"]
+
+
+def test_grouped_tasks_survive_values_sqlite_cannot_store(db_manager):
+    """
+    Vérifie qu'une valeur hors des bornes d'un entier SQLite (OverflowError) n'arrête pas le thread de la base.
+    """
+    db_manager.add_task("_db_save_correlation", ("ethereum", "eth"), "2024-01-01T00:00:00", 0.5, 1e9, False, "test-guid", "1d")
+    db_manager.add_task("_db_save_correlation", ("overflow", "ovf"), "2024-01-01T00:00:00", 0.5, 10 ** 20, False, "test-guid", "1d")
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    # Le thread traite toujours les tâches suivantes
+    db_manager.add_task("_db_save_correlation", ("solana", "sol"), "2024-01-01T00:00:00", 0.4, 1e9, False, "test-guid", "1d")
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    conn = sqlite3.connect(db_manager.db_name)
+    coin_ids = sorted(row[0] for row in conn.execute("SELECT coin_id FROM correlations WHERE session_guid = 'test-guid'"))
+    conn.close()
+
+    assert coin_ids == ["ethereum", "solana"]
+
+
+def test_db_save_tokens_skips_only_malformed_coins(db_manager):
+    """
+    Vérifie qu'un token mal formé dans TopCoinsSelected n'empêche pas l'enregistrement des autres.
+    """
+    coins = [{"id": "ethereum", "symbol": "eth"}, {"symbol": "noid"}, {"id": "broken", "symbol": None}, {"id": "solana", "symbol": "sol"}]
+
+    db_manager.add_task("_db_save_tokens", coins, "test-guid")
+    assert db_manager.wait_for_queue_completion(timeout=5)
+
+    conn = sqlite3.connect(db_manager.db_name)
+    coin_ids = sorted(row[0] for row in conn.execute("SELECT coin_id FROM tokens WHERE session_guid = 'test-guid'"))
+    conn.close()
+
+    assert coin_ids == ["ethereum", "solana"]
@@ -1,11 +1,12 @@
 from unittest.mock import ANY
 
+import numpy as np
 import pandas as pd
 # noinspection PyPackageRequirements
 import pytest
 
-from agents.rsi_calculator import RSICalculator
-from events import AnalysisConfigurationProvided, RSICalculated, CalculateRSIRequested
+from agents.rsi_calculator import RSICalculator, rsi_values
+from events import AnalysisConfigurationProvided, HistoricalPricesFetched, RSICalculated
 
 
 # On utilise la fixture partagée de conftest.py
@@ -22,20 +23,22 @@ def rsi_calculator(mock_service_bus, analysis_config):
     return calculator
 
 
-def test_handle_calculate_rsi_requested_adds_task(rsi_calculator, mocker):
-    """Teste que l'événement de requête pour le calcul RSI ajoute la bonne tâche."""
+def test_handle_historical_prices_fetched_adds_task(rsi_calculator, mocker):
+    """Teste que la réception des prix historiques ajoute la tâche de calcul RSI avec la série des clôtures."""
     mocker.patch.object(rsi_calculator, 'add_task')
 
-    event = CalculateRSIRequested(
+    event = HistoricalPricesFetched(
         coin_id_symbol=("bitcoin", "btc"),
-        prices_series_json='{"name":"close","index":[1,2],"data":[10,20]}',
+        prices_df_json='{"columns":["open","high","low","close","volume"],"index":[1,2],"data":[[1,2,0.5,10,5],[2,3,1.5,20,6]]}',
         timeframe="1d"
     )
 
-    rsi_calculator._handle_calculate_rsi_requested(event)
+    rsi_calculator._handle_historical_prices_fetched(event)
 
     # noinspection PyUnresolvedReferences
     rsi_calculator.add_task.assert_called_once_with("_calculate_rsi_task", ("bitcoin", "btc"), ANY, "1d")
+    # noinspection PyUnresolvedReferences
+    assert rsi_calculator.add_task.call_args.args[2].tolist() == [10.0, 20.0]
 
 
 def test_calculate_rsi_task_publishes_event(rsi_calculator):
@@ -75,3 +78,38 @@ def test_calculate_rsi_task_publishes_event(rsi_calculator):
     # Vérifier que le résultat est bien une chaîne de caractères (JSON) et non None
     assert isinstance(payload.rsi_series_json, str)
     assert payload.rsi_series_json != "null"
+
+
+def test_deserialize_close_series_keeps_only_close(rsi_calculator):
+    """Teste que seule la colonne 'close' est extraite du DataFrame OHLCV sérialisé."""
+    prices_df = pd.DataFrame(
+        [[1.0, 2.0, 0.5, 1.5, 10.0], [1.5, 2.5, 1.0, 2.0, 12.0]],
+        columns=["open", "high", "low", "close", "volume"],
+        index=pd.to_datetime([1700000000000, 1700086400000], unit="ms", utc=True),
+    )
+
+    close_series = rsi_calculator._deserialize_close_series(prices_df.to_json(orient="split"), ("bitcoin", "btc"))
+
+    assert close_series.tolist() == [1.5, 2.0]
+    assert close_series.index.equals(prices_df.index)
+
+
+def test_rsi_values_matches_pandas_rolling_formula():
+    """Teste que le RSI NumPy reproduit la formule pandas (moyennes glissantes des hausses et des baisses)."""
+    closes = np.array([
+        110, 112, 115, 114, 113, 111, 109, 110, 111, 113, 116, 118, 120,
+        121, 120, 118, 117, 119, 122, 123, 125, 124, 122, 120, 119, 120
+    ], dtype=float)
+    periods = 14
+
+    delta = pd.Series(closes).diff()
+    gain = delta.where(delta > 0, 0).rolling(window=periods).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=periods).mean()
+    expected = (100 - 100 / (1 + gain / loss)).dropna()
+
+    result = rsi_values(closes, periods)
+
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result, expected.to_numpy())
+    # Une série uniquement haussière donne un RSI de 100
+    assert (rsi_values(np.arange(20, dtype=float), periods) == 100).all()